@@ -1,35 +1,217 @@
-from domain.service import RegistrationService
+import logging
+import signal
+from datetime import datetime
+
+from domain.service import RegistrationService, TokenService
+from domain.util.signing import Signer, parse_keys
 from infrastructure.database import get_database
 from infrastructure.keycloak import Keycloak
 from infrastructure.repository import (
     SecurityRepository,
     TokenRepository,
-    Notifier
+    Notifier,
+    HttpNotifier,
+    OutboxNotifier,
+    OutboxRepository,
+    LedgerRepository
+)
+from infrastructure.producer import AsyncProducer
+from .exporter import start_metrics_server
+from .backfill import Backfill, Checkpoint, FileSource, KafkaSource
+from .consumer import (
+    Consumer,
+    ConsumerGroup,
+    RetryingConsumer,
+    RetryPolicy,
+    replay_dead_letters
 )
-from .consumer import Consumer, ConsumerGroup
 from ..schema import OwnerSchema
 
 
-def start_consumer(config):
-    group = ConsumerGroup({
+_log = logging.getLogger(__name__)
+
+
+def _consumer_config(config) -> dict:
+    return {
         'bootstrap.servers': config.KAFKA_SERVER,
         'group.id': 'AUTH',
         'enable.auto.commit': False,
-        'auto.offset.reset': 'earliest'
-    })
+        'auto.offset.reset': 'earliest',
+        'partition.assignment.strategy': config.KAFKA_ASSIGNMENT_STRATEGY,
+        'statistics.interval.ms': config.KAFKA_METRICS['stats_interval_ms']
+    }
 
-    db = get_database(config.MONGODB_SETTINGS)
-    keycloak = Keycloak(**config.KEYCLOAK_SETTINGS)
-    security_repo = SecurityRepository(keycloak)
-    token_repo = TokenRepository(db)
 
-    notifier = Notifier({
+def _retry_producer(config) -> AsyncProducer:
+    return AsyncProducer('retry', {
         'bootstrap.servers': config.KAFKA_SERVER,
         'client.id': 'AUTH',
         'message.max.bytes': 33554432
-    }, config.TEMPLATES, config.URLS)
+    }, **config.KAFKA_PRODUCER)
+
+
+def _registration_service(
+    config,
+    db,
+    keycloak_rate: float = None
+) -> RegistrationService:
+    keycloak = Keycloak(**config.KEYCLOAK_SETTINGS, rate=keycloak_rate)
+    security_repo = SecurityRepository(
+        keycloak,
+        config.REALM_CATALOG_REFRESH
+    )
+    security_repo.load_catalog()
+    token_repo = TokenRepository(db)
+    token_repo.create_indexes(config.TOKENS['ttl_grace'])
+
+    if config.OUTBOX['enabled']:
+        notifier = OutboxNotifier(
+            OutboxRepository(db),
+            config.TEMPLATES,
+            config.URLS
+        )
+    elif config.NOTIFIER_BACKEND == 'http':
+        notifier = HttpNotifier(
+            config.TEMPLATES,
+            config.URLS,
+            **config.HTTP_NOTIFIER
+        )
+    else:
+        notifier = Notifier({
+            'bootstrap.servers': config.KAFKA_SERVER,
+            'client.id': 'AUTH',
+            'message.max.bytes': 33554432
+        }, config.TEMPLATES, config.URLS, config.KAFKA_PRODUCER)
+
+    signer = None
+
+    if config.TOKENS['format'] == 'signed':
+        signer = Signer(
+            parse_keys(config.TOKENS['signing_keys']),
+            config.TOKENS['active_key']
+        )
+
+    token_svc = TokenService(token_repo, signer)
+    return RegistrationService(notifier, security_repo, token_svc)
+
+
+def start_consumer(config):
+    if config.KAFKA_METRICS['port']:
+        start_metrics_server(
+            config.KAFKA_METRICS['host'],
+            config.KAFKA_METRICS['port']
+        )
+
+    group = ConsumerGroup(_consumer_config(config), config.KAFKA_CONSUMER)
+    db = get_database(config.MONGODB_SETTINGS)
+    owner_svc = _registration_service(config, db)
+    options = {'key_field': 'doc'}
+
+    if config.KAFKA_LEDGER['enabled']:
+        ledger = LedgerRepository(db)
+        ledger.create_indexes(config.KAFKA_LEDGER['retention'])
+        options['ledger'] = ledger
+
+        if config.KAFKA_CONSUMER['batch_size'] <= 1:
+            _log.info(
+                'KAFKA_BATCH_SIZE is 1, the ledger costs one lookup and one '
+                'insert per message instead of one of each per batch'
+            )
+        elif config.KAFKA_CONSUMER['workers'] > 0:
+            _log.info(
+                'KAFKA_WORKERS is set, the ledger costs one lookup per batch '
+                'and one insert per message'
+            )
+
+    if config.KAFKA_RETRY['enabled']:
+        policy = RetryPolicy(
+            'NEW_OWNER',
+            _retry_producer(config),
+            config.KAFKA_RETRY['delays']
+        )
+        owner_consumer = RetryingConsumer(
+            OwnerSchema(),
+            owner_svc.import_owner,
+            policy,
+            **options
+        )
+
+        for topic in policy.retry_topics:
+            retry_consumer = RetryingConsumer(
+                OwnerSchema(),
+                owner_svc.import_owner,
+                policy,
+                **options
+            )
+            group.add(retry_consumer, topic, batch_size=1, workers=0)
+    else:
+        owner_consumer = Consumer(
+            OwnerSchema(),
+            owner_svc.import_owner,
+            **options
+        )
 
-    owner_svc = RegistrationService(notifier, security_repo, token_repo)
-    owner_consumer = Consumer(OwnerSchema(), owner_svc.import_owner)
     group.add(owner_consumer, 'NEW_OWNER')
     group.wait()
+
+
+def replay_dead_owners(config, limit: int = None) -> int:
+    producer = _retry_producer(config)
+
+    try:
+        return replay_dead_letters(
+            _consumer_config(config),
+            producer,
+            'NEW_OWNER',
+            limit
+        )
+    finally:
+        producer.close()
+
+
+def backfill_owners(
+    config,
+    path: str = None,
+    topic: str = 'NEW_OWNER',
+    start_offset: int = None,
+    end_offset: int = None,
+    start_time: datetime = None,
+    end_time: datetime = None,
+    concurrency: int = 8,
+    rate: float = None,
+    checkpoint: str = 'backfill-owners.json',
+    failures: str = None,
+    echo=print
+) -> dict:
+    if path is not None:
+        source = FileSource(path)
+    else:
+        source = KafkaSource(
+            _consumer_config(config),
+            topic,
+            start_offset,
+            end_offset,
+            start_time,
+            end_time
+        )
+
+    db = get_database(config.MONGODB_SETTINGS)
+    owner_svc = _registration_service(config, db, keycloak_rate=rate)
+    backfill = Backfill(
+        source,
+        OwnerSchema(),
+        owner_svc.import_owner,
+        Checkpoint(checkpoint, source.name),
+        concurrency=concurrency,
+        key_field='doc',
+        failures_path=failures,
+        echo=echo
+    )
+
+    def shutdown(*_):
+        backfill.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    return backfill.run()
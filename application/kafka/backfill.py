@@ -0,0 +1,365 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator
+from confluent_kafka import (
+    OFFSET_END,
+    Consumer,
+    KafkaError,
+    KafkaException,
+    TopicPartition
+)
+from marshmallow import Schema, ValidationError
+
+from domain.util import metrics
+from .consumer.dispatcher import KeyedWorkerPool, OffsetTracker, json_key
+
+
+_log = logging.getLogger(__name__)
+
+
+class FileRecord:
+    def __init__(self, path: str, line: int, value: str):
+        self._path = path
+        self._line = line
+        self._value = value
+
+    def topic(self) -> str:
+        return self._path
+
+    def partition(self) -> int:
+        return 0
+
+    def offset(self) -> int:
+        return self._line
+
+    def value(self) -> str:
+        return self._value
+
+
+class FileSource:
+    def __init__(self, path: str):
+        self._path = path
+        self._positions = {}
+
+    @property
+    def name(self) -> str:
+        return f'file:{os.path.abspath(self._path)}'
+
+    def seek(self, positions: Dict[int, int]):
+        self._positions = positions
+
+    def total(self) -> int:
+        start = self._positions.get(0, 0)
+
+        with open(self._path, 'rb') as file:
+            return sum(
+                1 for line, value in enumerate(file)
+                if line >= start and value.strip()
+            )
+
+    def __iter__(self) -> Iterator[FileRecord]:
+        start = self._positions.get(0, 0)
+
+        with open(self._path, encoding='utf-8') as file:
+            for line, value in enumerate(file):
+                if line >= start and value.strip():
+                    yield FileRecord(self._path, line, value)
+
+    def close(self):
+        pass
+
+
+class KafkaSource:
+    def __init__(
+        self,
+        config: dict,
+        topic: str,
+        start_offset: int = None,
+        end_offset: int = None,
+        start_time: datetime = None,
+        end_time: datetime = None,
+        timeout: float = 10.0
+    ):
+        self._consumer = Consumer({
+            **config,
+            'group.id': f'{config["group.id"]}.BACKFILL',
+            'enable.auto.commit': False,
+            'enable.auto.offset.store': False,
+            'enable.partition.eof': True
+        })
+        self._topic = topic
+        self._timeout = timeout
+        self._starts = {}
+        self._ends = {}
+        self._resolve(start_offset, end_offset, start_time, end_time)
+
+    @property
+    def name(self) -> str:
+        return f'kafka:{self._topic}'
+
+    def _offsets_for_time(self, partitions, when: datetime) -> dict:
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+
+        millis = int(when.timestamp() * 1000)
+        result = self._consumer.offsets_for_times(
+            [TopicPartition(self._topic, p, millis) for p in partitions],
+            timeout=self._timeout
+        )
+
+        return {tp.partition: tp.offset for tp in result}
+
+    def _resolve(self, start_offset, end_offset, start_time, end_time):
+        metadata = self._consumer.list_topics(self._topic, self._timeout)
+        partitions = list(metadata.topics[self._topic].partitions)
+        watermarks = {
+            p: self._consumer.get_watermark_offsets(
+                TopicPartition(self._topic, p),
+                timeout=self._timeout
+            )
+            for p in partitions
+        }
+
+        by_start = by_end = {}
+
+        if start_time is not None:
+            by_start = self._offsets_for_time(partitions, start_time)
+
+        if end_time is not None:
+            by_end = self._offsets_for_time(partitions, end_time)
+
+        for p, (low, high) in watermarks.items():
+            start = low if start_offset is None else max(low, start_offset)
+            end = high if end_offset is None else min(high, end_offset)
+
+            if start_time is not None:
+                offset = by_start[p]
+                start = high if offset in (-1, OFFSET_END) else offset
+
+            if end_time is not None:
+                offset = by_end[p]
+                end = high if offset in (-1, OFFSET_END) else offset
+
+            self._starts[p] = start
+            self._ends[p] = end
+
+    def seek(self, positions: Dict[int, int]):
+        for p, position in positions.items():
+            if p in self._starts:
+                self._starts[p] = max(self._starts[p], position)
+
+    def total(self) -> int:
+        return sum(
+            max(0, self._ends[p] - self._starts[p])
+            for p in self._starts
+        )
+
+    def __iter__(self) -> Iterator[Any]:
+        pending = {
+            p for p in self._starts
+            if self._starts[p] < self._ends[p]
+        }
+
+        self._consumer.assign([
+            TopicPartition(self._topic, p, self._starts[p])
+            for p in pending
+        ])
+
+        def finish(p):
+            pending.discard(p)
+            self._consumer.pause([TopicPartition(self._topic, p)])
+
+        while pending:
+            for msg in self._consumer.consume(500, 1.0):
+                p = msg.partition()
+
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        raise KafkaException(msg.error())
+
+                    if p in pending:
+                        finish(p)
+
+                    continue
+
+                if p not in pending:
+                    continue
+
+                if msg.offset() >= self._ends[p]:
+                    finish(p)
+                    continue
+
+                yield msg
+
+                if msg.offset() + 1 >= self._ends[p]:
+                    finish(p)
+
+    def close(self):
+        self._consumer.close()
+
+
+class Checkpoint:
+    def __init__(self, path: str, source: str):
+        self._path = path
+        self._source = source
+
+    def load(self) -> Dict[int, int]:
+        if not os.path.exists(self._path):
+            return {}
+
+        with open(self._path, encoding='utf-8') as file:
+            data = json.load(file)
+
+        if data.get('source') != self._source:
+            _log.warning(
+                f'Ignoring checkpoint {self._path} '
+                f'written for {data.get("source")}'
+            )
+            return {}
+
+        return {int(p): offset for p, offset in data['positions'].items()}
+
+    def save(self, positions: Dict[int, int]):
+        tmp = f'{self._path}.tmp'
+
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump({
+                'source': self._source,
+                'positions': {str(p): o for p, o in positions.items()},
+                'saved_at': datetime.utcnow().isoformat()
+            }, file)
+
+        os.replace(tmp, self._path)
+
+
+class Backfill:
+    def __init__(
+        self,
+        source,
+        schema: Schema,
+        callback: Callable[[dict], Any],
+        checkpoint: Checkpoint,
+        concurrency: int = 8,
+        key_field: str = None,
+        failures_path: str = None,
+        report_interval: float = 5.0,
+        echo: Callable[[str], Any] = print
+    ):
+        self._source = source
+        self._schema = schema
+        self._callback = callback
+        self._checkpoint = checkpoint
+        self._concurrency = concurrency
+        self._key_field = key_field
+        self._failures_path = failures_path
+        self._report_interval = report_interval
+        self._echo = echo
+        self._tracker = OffsetTracker()
+        self._positions = {}
+        self._lock = Lock()
+        self._running = False
+        self._counts = {'imported': 0, 'invalid': 0, 'failed': 0}
+        self._failures = None
+
+    def _record(self, outcome: str, record):
+        with self._lock:
+            self._counts[outcome] += 1
+
+            if outcome != 'imported' and self._failures is not None:
+                value = record.value() or b''
+
+                if isinstance(value, bytes):
+                    value = value.decode('utf-8', 'replace')
+
+                self._failures.write(value.rstrip('\n') + '\n')
+
+        metrics.counter('backfill_records_total', result=outcome).inc()
+
+    def _key(self, record) -> bytes:
+        if self._key_field is None:
+            return None
+
+        return json_key(record.value(), self._key_field)
+
+    def _import(self, record):
+        try:
+            data = self._schema.loads(record.value())
+            self._callback(data)
+            self._record('imported', record)
+        except ValidationError as e:
+            _log.warning(f'Invalid record at {record.offset()}: {e}')
+            self._record('invalid', record)
+        except Exception as e:
+            _log.error(f'Failed to import record at {record.offset()}: {e}')
+            self._record('failed', record)
+
+    def _save(self):
+        for tp in self._tracker.committable():
+            self._positions[tp.partition] = tp.offset
+
+        self._checkpoint.save(self._positions)
+
+    def _report(self, total: int, started_at: float):
+        done = sum(self._counts.values())
+        elapsed = max(time.monotonic() - started_at, 1e-6)
+        rate = done / elapsed
+        eta = (total - done) / rate if rate and total > done else 0
+
+        self._echo(
+            f'{done}/{total} records '
+            f'({self._counts["imported"]} imported, '
+            f'{self._counts["invalid"]} invalid, '
+            f'{self._counts["failed"]} failed) '
+            f'{rate:.1f}/s, ETA {timedelta(seconds=round(eta))}'
+        )
+
+    def run(self) -> dict:
+        self._positions = self._checkpoint.load()
+        self._source.seek(self._positions)
+        total = self._source.total()
+        started_at = last_report = time.monotonic()
+        self._running = True
+
+        if self._failures_path:
+            self._failures = open(self._failures_path, 'a', encoding='utf-8')
+
+        pool = KeyedWorkerPool(
+            self._concurrency,
+            2,
+            self._import,
+            self._tracker.done
+        )
+
+        try:
+            for record in self._source:
+                if not self._running:
+                    break
+
+                self._tracker.add(record)
+                pool.submit(self._key(record), record)
+
+                while pool.is_saturated():
+                    time.sleep(0.01)
+                    pool.flush()
+
+                if time.monotonic() - last_report >= self._report_interval:
+                    self._save()
+                    self._report(total, started_at)
+                    last_report = time.monotonic()
+        finally:
+            pool.shutdown()
+            self._save()
+            self._report(total, started_at)
+            self._source.close()
+
+            if self._failures is not None:
+                self._failures.close()
+
+        return dict(self._counts)
+
+    def stop(self):
+        self._running = False
@@ -1,4 +1,11 @@
-from .consumer import Consumer, ConsumerGroup
+from .consumer import Consumer, ConsumerGroup, RetryingConsumer
+from .retry import RetryPolicy, replay_dead_letters
 
 
-__all__ = ['Consumer', 'ConsumerGroup']
+__all__ = [
+    'Consumer',
+    'ConsumerGroup',
+    'RetryingConsumer',
+    'RetryPolicy',
+    'replay_dead_letters'
+]
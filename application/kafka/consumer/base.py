@@ -1,8 +1,20 @@
+import json
 import logging
+import time
 
 from abc import ABC, abstractmethod
 from threading import Thread
-from confluent_kafka import Consumer, KafkaError, KafkaException
+from typing import List
+from confluent_kafka import (
+    Consumer,
+    KafkaError,
+    KafkaException,
+    TopicPartition
+)
+
+from domain.util import metrics
+from .dispatcher import KeyedWorkerPool, OffsetTracker, coalesce
+from .retry import RetryLater
 
 
 _log = logging.getLogger(__name__)
@@ -12,6 +24,9 @@ class BaseConsumer(ABC):
     def __init__(self):
         self._running = False
         self._thread = None
+        self._topic = None
+        self._stats_at = None
+        self._stats_consumed = {}
 
     def _handle_error(self, msg):
         if msg.error().code() == KafkaError._PARTITION_EOF:
@@ -24,13 +39,125 @@ class BaseConsumer(ABC):
         else:
             raise KafkaException(msg.error())
 
+    def _on_stats(self, stats: str):
+        stats = json.loads(stats)
+        now = time.monotonic()
+        elapsed = now - self._stats_at if self._stats_at else None
+        self._stats_at = now
+
+        for topic, topic_stats in stats.get('topics', {}).items():
+            total_lag = 0
+
+            for partition, p_stats in topic_stats['partitions'].items():
+                if partition == '-1' or p_stats.get('consumer_lag', -1) < 0:
+                    continue
+
+                labels = {'topic': topic, 'partition': partition}
+                total_lag += p_stats['consumer_lag']
+                metrics.gauge('kafka_consumer_lag', **labels).set(
+                    p_stats['consumer_lag']
+                )
+                metrics.gauge('kafka_high_watermark', **labels).set(
+                    p_stats['hi_offset']
+                )
+                metrics.gauge('kafka_committed_offset', **labels).set(
+                    p_stats['committed_offset']
+                )
+
+            metrics.gauge('kafka_topic_lag', topic=topic).set(total_lag)
+
+            consumed = metrics.counter('kafka_consumed_total', topic=topic)
+            previous = self._stats_consumed.get(topic, consumed.value)
+            self._stats_consumed[topic] = consumed.value
+
+            if elapsed:
+                metrics.gauge('kafka_consumed_per_second', topic=topic).set(
+                    (consumed.value - previous) / elapsed
+                )
+
+    def _create_consumer(self, config: dict) -> Consumer:
+        config = {**config, 'enable.auto.offset.store': False}
+
+        if config.get('statistics.interval.ms'):
+            config['stats_cb'] = self._on_stats
+
+        return Consumer(config)
+
+    def _commit(self, consumer: Consumer, asynchronous: bool):
+        latency = metrics.histogram('kafka_commit_seconds', topic=self._topic)
+
+        try:
+            with latency.time():
+                consumer.commit(asynchronous=asynchronous)
+        except KafkaException as e:
+            if e.args[0].code() != KafkaError._NO_OFFSET:
+                raise
+
+    def _store_offsets(self, consumer: Consumer, msgs: list):
+        latest = {}
+
+        for msg in msgs:
+            latest[(msg.topic(), msg.partition())] = msg.offset() + 1
+
+        consumer.store_offsets(offsets=[
+            TopicPartition(topic, partition, offset)
+            for (topic, partition), offset in latest.items()
+        ])
+
+    def _describe(self, partitions: List[TopicPartition]) -> str:
+        return ', '.join(f'{tp.topic}:{tp.partition}' for tp in partitions)
+
+    def _on_assign(self, consumer: Consumer, partitions: List[TopicPartition]):
+        _log.info(f'Assigned partitions {self._describe(partitions)}')
+
+    def _commit_on_revoke(
+        self,
+        consumer: Consumer,
+        partitions: List[TopicPartition]
+    ):
+        try:
+            self._commit(consumer, asynchronous=False)
+        except KafkaException as e:
+            _log.warning(f'Unable to commit on revoke: {e}')
+
+        _log.info(f'Revoked partitions {self._describe(partitions)}')
+
+    def _resume_due(self, consumer: Consumer, deferred: dict):
+        now = time.monotonic()
+
+        for key, (tp, due) in list(deferred.items()):
+            if due <= now:
+                consumer.resume([tp])
+                del deferred[key]
+
     def _loop(self, config, topic, timeout, asyn):
-        consumer = Consumer(config)
-        consumer.subscribe([topic])
+        consumer = self._create_consumer(config)
+        consumed = metrics.counter('kafka_consumed_total', topic=topic)
+        deferred = {}
+
+        def on_revoke(consumer, partitions):
+            for tp in partitions:
+                deferred.pop((tp.topic, tp.partition), None)
+
+            self._commit_on_revoke(consumer, partitions)
+
+        def on_lost(consumer, partitions):
+            for tp in partitions:
+                deferred.pop((tp.topic, tp.partition), None)
+
+            _log.warning(f'Lost partitions {self._describe(partitions)}')
+
+        consumer.subscribe(
+            [topic],
+            on_assign=self._on_assign,
+            on_revoke=on_revoke,
+            on_lost=on_lost
+        )
         _log.info(f'Topic {topic} started')
 
         try:
             while self._running:
+                self._resume_due(consumer, deferred)
                 msg = consumer.poll(timeout=timeout)
 
                 if msg is None:
@@ -38,17 +165,249 @@ class BaseConsumer(ABC):
 
                 if msg.error():
                     self._handle_error(msg)
+                    continue
+
+                try:
+                    if self.filter_processed([msg]) and self.process(msg):
+                        self.mark_processed([msg])
+                except RetryLater as e:
+                    tp = TopicPartition(
+                        msg.topic(),
+                        msg.partition(),
+                        msg.offset()
+                    )
+                    consumer.pause([tp])
+                    consumer.seek(tp)
+                    deferred[(tp.topic, tp.partition)] = (
+                        tp,
+                        time.monotonic() + e.delay
+                    )
+                    continue
+
+                consumed.inc()
+                consumer.store_offsets(message=msg)
+                self._commit(consumer, asynchronous=asyn)
+        except Exception as e:
+            _log.exception(e)
+        finally:
+            self._running = False
+            consumer.close()
+            _log.info(f'Topic {topic} finished')
+
+    def _batch_loop(
+        self,
+        config,
+        topic,
+        timeout,
+        batch_size,
+        commit_interval,
+        commit_every,
+        workers,
+        queue_size,
+        coalesce_keys,
+        drain_timeout
+    ):
+        consumer = self._create_consumer(config)
+        consumed = metrics.counter('kafka_consumed_total', topic=topic)
+        commits = metrics.counter('kafka_commits_total', topic=topic)
+        pauses = metrics.counter('kafka_pauses_total', topic=topic)
+        in_flight = metrics.gauge('kafka_in_flight_messages', topic=topic)
+        coalesced = metrics.counter('kafka_coalesced_total', topic=topic)
+        coalesce_ratio = metrics.gauge('kafka_coalesce_ratio', topic=topic)
+        tracker = OffsetTracker()
+        pool = None
+
+        if workers > 0:
+            pool = KeyedWorkerPool(
+                workers,
+                queue_size,
+                self._process_one,
+                tracker.done,
+                tracker.is_current
+            )
+
+        def store_completed():
+            offsets = tracker.committable()
+
+            if offsets:
+                consumer.store_offsets(offsets=offsets)
+
+            in_flight.set(tracker.in_flight())
+            return offsets
+
+        def drain(partitions):
+            deadline = time.monotonic() + drain_timeout
+
+            while tracker.in_flight(partitions):
+                if pool.error is not None:
+                    break
+
+                pool.flush()
+
+                if time.monotonic() >= deadline:
+                    _log.warning(
+                        f'{tracker.in_flight(partitions)} messages still '
+                        f'in flight after {drain_timeout}s, they will be '
+                        'redelivered'
+                    )
+                    break
+
+                time.sleep(0.05)
+
+        cooperative = config.get(
+            'partition.assignment.strategy'
+        ) == 'cooperative-sticky'
+
+        def on_assign(consumer, partitions):
+            if paused:
+                if cooperative:
+                    consumer.incremental_assign(partitions)
+                else:
+                    consumer.assign(partitions)
+
+                consumer.pause(partitions)
+
+            self._on_assign(consumer, partitions)
+
+        def on_revoke(consumer, partitions):
+            if pool is not None:
+                drain(partitions)
+                store_completed()
+                pool.discard(partitions)
+                tracker.discard(partitions)
+
+            self._commit_on_revoke(consumer, partitions)
+
+        def on_lost(consumer, partitions):
+            if pool is not None:
+                pool.discard(partitions)
+
+            tracker.discard(partitions)
+            _log.warning(f'Lost partitions {self._describe(partitions)}')
+
+        consumer.subscribe(
+            [topic],
+            on_assign=on_assign,
+            on_revoke=on_revoke,
+            on_lost=on_lost
+        )
+        _log.info(
+            f'Topic {topic} started '
+            f'(batch size {batch_size}, workers {workers})'
+        )
+
+        uncommitted = 0
+        last_commit = time.monotonic()
+        paused = False
+
+        try:
+            while self._running:
+                if pool is not None:
+                    pool.flush()
+
+                msgs = []
+
+                for msg in consumer.consume(batch_size, timeout):
+                    if msg.error():
+                        self._handle_error(msg)
+                    else:
+                        msgs.append(msg)
+
+                if msgs:
+                    consumed.inc(len(msgs))
+                    uncommitted += len(msgs)
+
+                if msgs and coalesce_keys:
+                    kept, dropped = coalesce(msgs, self.message_key)
+                    coalesced.inc(len(dropped))
+                    coalesce_ratio.set(coalesced.value / consumed.value)
                 else:
-                    self.process(msg)
-                    consumer.commit(asynchronous=asyn)
+                    kept, dropped = msgs, []
+
+                if kept:
+                    pending = self.filter_processed(kept)
+
+                    if len(pending) < len(kept):
+                        ids = {id(msg) for msg in pending}
+                        dropped += [
+                            msg for msg in kept if id(msg) not in ids
+                        ]
+                        kept = pending
+
+                if msgs and pool is not None:
+                    for msg in msgs:
+                        tracker.add(msg)
+
+                    for msg in dropped:
+                        tracker.done(msg)
+
+                    for msg in kept:
+                        pool.submit(self.message_key(msg), msg)
+                elif msgs:
+                    self.process_batch(kept)
+                    self._store_offsets(consumer, msgs)
+
+                if pool is not None:
+                    store_completed()
+
+                    if pool.error is not None:
+                        raise pool.error
+
+                    if not paused and pool.is_saturated():
+                        consumer.pause(consumer.assignment())
+                        paused = True
+                        pauses.inc()
+                        _log.info(f'Topic {topic} paused, workers are busy')
+                    elif paused and pool.has_room():
+                        consumer.resume(consumer.assignment())
+                        paused = False
+                        _log.info(f'Topic {topic} resumed')
+
+                elapsed = time.monotonic() - last_commit
+
+                if uncommitted >= commit_every or (
+                    uncommitted and elapsed >= commit_interval
+                ):
+                    self._commit(consumer, asynchronous=True)
+                    commits.inc()
+                    uncommitted = 0
+                    last_commit = time.monotonic()
         except Exception as e:
             _log.exception(e)
         finally:
             self._running = False
+
+            try:
+                if pool is not None:
+                    if not pool.shutdown(drain_timeout):
+                        _log.warning(
+                            f'Topic {topic} drain timed out with '
+                            f'{tracker.in_flight()} messages in flight'
+                        )
+
+                    store_completed()
+
+                self._commit(consumer, asynchronous=False)
+            except Exception as e:
+                _log.exception(e)
+
             consumer.close()
             _log.info(f'Topic {topic} finished')
 
-    def start(self, config: dict, topic: str, timeout=1.0, asyn=False):
+    def start(
+        self,
+        config: dict,
+        topic: str,
+        timeout=1.0,
+        asyn=False,
+        batch_size=1,
+        commit_interval=5.0,
+        commit_every=500,
+        workers=0,
+        queue_size=100,
+        coalesce_keys=False,
+        drain_timeout=30.0
+    ):
         if self._running:
             _log.warning('Consumer is already running')
             return
@@ -60,8 +419,27 @@ class BaseConsumer(ABC):
             raise ValueError('"topic" must not be a blank string')
 
         self._running = True
-        args = (config, topic, timeout, asyn)
-        self._thread = Thread(target=self._loop, args=args)
+        self._topic = topic
+
+        if batch_size > 1 or workers > 0:
+            target = self._batch_loop
+            args = (
+                config,
+                topic,
+                timeout,
+                batch_size,
+                commit_interval,
+                commit_every,
+                workers,
+                queue_size,
+                coalesce_keys,
+                drain_timeout
+            )
+        else:
+            target = self._loop
+            args = (config, topic, timeout, asyn)
+
+        self._thread = Thread(target=target, args=args)
         self._thread.daemon = True
         self._thread.start()
 
@@ -69,10 +447,30 @@ class BaseConsumer(ABC):
         if self._thread and self._thread.is_alive():
             self._thread.join()
 
-    def shutdown(self):
+    def stop(self):
         self._running = False
+
+    def shutdown(self):
+        self.stop()
         self.wait()
 
+    def message_key(self, msg: any) -> bytes:
+        return msg.key()
+
+    def filter_processed(self, msgs: List[any]) -> List[any]:
+        return msgs
+
+    def mark_processed(self, msgs: List[any]):
+        pass
+
+    def _process_one(self, msg: any):
+        if self.process(msg):
+            self.mark_processed([msg])
+
+    def process_batch(self, msgs: List[any]):
+        applied = [msg for msg in msgs if self.process(msg)]
+        self.mark_processed(applied)
+
     @abstractmethod
     def process(self, message: any):
         pass
@@ -1,30 +1,118 @@
 import signal
-from typing import Callable, Any
+from typing import Callable, Any, List
 from marshmallow import Schema
 
+from domain.util import metrics
+from infrastructure.repository import LedgerRepository
+
 from .base import BaseConsumer
+from .dispatcher import json_key
 from .error import error_handler
+from .retry import RetryLater, RetryPolicy
 
 
 class Consumer(BaseConsumer):
-    def __init__(self, schema: Schema, callback: Callable[[dict], Any]):
+    def __init__(
+        self,
+        schema: Schema,
+        callback: Callable[[dict], Any],
+        key_field: str = None,
+        ledger: LedgerRepository = None
+    ):
         super().__init__()
         self._schema = schema
         self._callback = callback
+        self._key_field = key_field
+        self._ledger = ledger
+
+    def _ledger_id(self, msg: any) -> str:
+        return f'{msg.topic()}:{msg.partition()}:{msg.offset()}'
+
+    def filter_processed(self, msgs: List[any]) -> List[any]:
+        if self._ledger is None:
+            return msgs
+
+        processed = self._ledger.find_processed(
+            list({self._ledger_id(msg) for msg in msgs})
+        )
+
+        if processed:
+            metrics.counter(
+                'kafka_ledger_skipped_total',
+                topic=msgs[0].topic()
+            ).inc(len(processed))
+
+        return [msg for msg in msgs if self._ledger_id(msg) not in processed]
+
+    def mark_processed(self, msgs: List[any]):
+        if self._ledger is not None:
+            self._ledger.mark_processed(
+                list({self._ledger_id(msg) for msg in msgs})
+            )
+
+    def message_key(self, msg: any) -> bytes:
+        key = msg.key()
+
+        if key or self._key_field is None:
+            return key
+
+        return json_key(msg.value(), self._key_field)
+
+    def _handle(self, msg: any):
+        deserialize = metrics.histogram(
+            'kafka_deserialize_seconds',
+            topic=msg.topic()
+        )
+        callback = metrics.histogram(
+            'kafka_callback_seconds',
+            topic=msg.topic()
+        )
+
+        with deserialize.time():
+            data = self._schema.loads(msg.value())
+
+        with callback.time():
+            self._callback(data)
 
     @error_handler
     def process(self, msg: any):
-        data = self._schema.loads(msg.value())
-        self._callback(data)
+        self._handle(msg)
+        return True
+
+
+class RetryingConsumer(Consumer):
+    def __init__(
+        self,
+        schema: Schema,
+        callback: Callable[[dict], Any],
+        policy: RetryPolicy,
+        key_field: str = None,
+        ledger: LedgerRepository = None
+    ):
+        super().__init__(schema, callback, key_field, ledger)
+        self._policy = policy
+
+    def process(self, msg: any):
+        delay = self._policy.delay(msg)
+
+        if delay > 0:
+            raise RetryLater(delay)
+
+        try:
+            self._handle(msg)
+            return True
+        except Exception as e:
+            self._policy.forward(msg, e)
 
 
 class ConsumerGroup:
-    def __init__(self, config: dict) -> None:
+    def __init__(self, config: dict, options: dict = None) -> None:
         self._config = config
+        self._options = options or {}
         self._consumers = []
 
-    def add(self, consumer: BaseConsumer, topic: str):
-        consumer.start(self._config, topic)
+    def add(self, consumer: BaseConsumer, topic: str, **options):
+        consumer.start(self._config, topic, **{**self._options, **options})
         self._consumers.append(consumer)
 
     def wait(self):
@@ -40,4 +128,7 @@ class ConsumerGroup:
 
     def shutdown(self):
         for consumer in self._consumers:
-            consumer.shutdown()
+            consumer.stop()
+
+        for consumer in self._consumers:
+            consumer.wait()
@@ -0,0 +1,236 @@
+import json
+import time
+import zlib
+from collections import OrderedDict, deque
+from queue import Full, Queue
+from threading import Lock, Thread
+from typing import Callable, List, Tuple
+from confluent_kafka import TopicPartition
+
+
+def json_key(value, field: str) -> bytes:
+    try:
+        key = json.loads(value).get(field)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    return str(key).encode() if key is not None else None
+
+
+def coalesce(
+    msgs: List[any],
+    key_func: Callable[[any], bytes]
+) -> Tuple[List[any], List[any]]:
+    def scoped_key(msg):
+        key = key_func(msg)
+
+        if key is None:
+            return None
+
+        return msg.topic(), msg.partition(), key
+
+    keys = [scoped_key(msg) for msg in msgs]
+    latest = {key: index for index, key in enumerate(keys) if key is not None}
+    kept, dropped = [], []
+
+    for index, msg in enumerate(msgs):
+        if keys[index] is None or latest[keys[index]] == index:
+            kept.append(msg)
+        else:
+            dropped.append(msg)
+
+    return kept, dropped
+
+
+class OffsetTracker:
+    def __init__(self):
+        self._partitions = {}
+        self._lock = Lock()
+
+    def add(self, msg):
+        key = (msg.topic(), msg.partition())
+
+        with self._lock:
+            offsets = self._partitions.setdefault(key, OrderedDict())
+            offsets[msg.offset()] = (id(msg), False)
+
+    def is_current(self, msg) -> bool:
+        key = (msg.topic(), msg.partition())
+
+        with self._lock:
+            entry = self._partitions.get(key, {}).get(msg.offset())
+
+            return entry is not None and entry[0] == id(msg)
+
+    def done(self, msg):
+        key = (msg.topic(), msg.partition())
+
+        with self._lock:
+            offsets = self._partitions.get(key)
+            entry = offsets.get(msg.offset()) if offsets is not None else None
+
+            if entry is not None and entry[0] == id(msg):
+                offsets[msg.offset()] = (entry[0], True)
+
+    def committable(self) -> List[TopicPartition]:
+        result = []
+
+        with self._lock:
+            for (topic, partition), offsets in self._partitions.items():
+                last = None
+
+                while offsets:
+                    offset, (_, is_done) = next(iter(offsets.items()))
+
+                    if not is_done:
+                        break
+
+                    offsets.popitem(last=False)
+                    last = offset
+
+                if last is not None:
+                    result.append(TopicPartition(topic, partition, last + 1))
+
+        return result
+
+    def in_flight(self, partitions: List[TopicPartition] = None) -> int:
+        with self._lock:
+            if partitions is None:
+                keys = list(self._partitions)
+            else:
+                keys = [(tp.topic, tp.partition) for tp in partitions]
+
+            return sum(
+                1
+                for key in keys
+                for _, is_done in self._partitions.get(key, {}).values()
+                if not is_done
+            )
+
+    def discard(self, partitions: List[TopicPartition]):
+        with self._lock:
+            for tp in partitions:
+                self._partitions.pop((tp.topic, tp.partition), None)
+
+
+class KeyedWorkerPool:
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        handler: Callable[[any], None],
+        on_done: Callable[[any], None],
+        is_current: Callable[[any], bool] = None
+    ):
+        self._handler = handler
+        self._on_done = on_done
+        self._is_current = is_current
+        self._queues = [Queue(queue_size) for _ in range(workers)]
+        self._backlogs = [deque() for _ in range(workers)]
+        self._abandoned = False
+        self.error = None
+        self._threads = [
+            Thread(target=self._work, args=(queue,), daemon=True)
+            for queue in self._queues
+        ]
+
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self, queue: Queue):
+        while True:
+            msg = queue.get()
+
+            if msg is None or self._abandoned:
+                break
+
+            if self._is_current is not None and not self._is_current(msg):
+                continue
+
+            try:
+                self._handler(msg)
+            except Exception as e:
+                self.error = e
+                self._abandoned = True
+                break
+
+            self._on_done(msg)
+
+    def submit(self, key: bytes, msg):
+        index = zlib.crc32(key or b'') % len(self._queues)
+        backlog = self._backlogs[index]
+
+        if backlog:
+            backlog.append(msg)
+            return
+
+        try:
+            self._queues[index].put_nowait(msg)
+        except Full:
+            backlog.append(msg)
+
+    def flush(self):
+        for queue, backlog in zip(self._queues, self._backlogs):
+            while backlog:
+                try:
+                    queue.put_nowait(backlog[0])
+                except Full:
+                    break
+
+                backlog.popleft()
+
+    def discard(self, partitions: List[TopicPartition]):
+        keys = {(tp.topic, tp.partition) for tp in partitions}
+
+        for index, backlog in enumerate(self._backlogs):
+            self._backlogs[index] = deque(
+                msg for msg in backlog
+                if (msg.topic(), msg.partition()) not in keys
+            )
+
+    def is_saturated(self) -> bool:
+        return any(self._backlogs) or any(
+            queue.full() for queue in self._queues
+        )
+
+    def has_room(self) -> bool:
+        return not any(self._backlogs) and all(
+            queue.qsize() <= queue.maxsize // 2
+            for queue in self._queues
+        )
+
+    def shutdown(self, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+
+            return max(0, deadline - time.monotonic())
+
+        while any(self._backlogs) and not self._abandoned:
+            self.flush()
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+            time.sleep(0.01)
+
+        for queue in self._queues:
+            try:
+                if self._abandoned:
+                    queue.put_nowait(None)
+                else:
+                    queue.put(None, timeout=remaining())
+            except Full:
+                pass
+
+        for thread in self._threads:
+            thread.join(remaining())
+
+        drained = not any(thread.is_alive() for thread in self._threads)
+
+        if not drained:
+            self._abandoned = True
+
+        return drained
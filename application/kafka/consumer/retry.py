@@ -0,0 +1,239 @@
+import logging
+import time
+from typing import Dict, List
+from confluent_kafka import (
+    Consumer,
+    KafkaError,
+    KafkaException,
+    TopicPartition
+)
+from marshmallow import ValidationError
+
+from domain.exception import (
+    AuthenticationError,
+    AuthorizationError,
+    GroupError,
+    RoleError,
+    UserError
+)
+from domain.util import metrics
+from infrastructure.producer import AsyncProducer
+
+
+_log = logging.getLogger(__name__)
+_non_retryable = (
+    ValidationError,
+    AuthenticationError,
+    AuthorizationError,
+    GroupError,
+    RoleError,
+    UserError
+)
+
+ORIGINAL_TOPIC = 'x-original-topic'
+ATTEMPT = 'x-retry-attempt'
+NOT_BEFORE = 'x-not-before'
+ERROR_TYPE = 'x-error-type'
+ERROR_MESSAGE = 'x-error-message'
+FAILED_AT = 'x-failed-at'
+SOURCE = 'x-source'
+
+_retry_headers = (
+    ORIGINAL_TOPIC,
+    ATTEMPT,
+    NOT_BEFORE,
+    ERROR_TYPE,
+    ERROR_MESSAGE,
+    FAILED_AT,
+    SOURCE
+)
+
+
+class RetryLater(Exception):
+    def __init__(self, delay: float):
+        super().__init__(f'Message is not due for {delay:.1f}s')
+        self.delay = delay
+
+
+def _headers(msg) -> dict:
+    return {
+        key: value.decode() if isinstance(value, bytes) else value
+        for key, value in (msg.headers() or [])
+    }
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        topic: str,
+        producer: AsyncProducer,
+        delays: List[float],
+        delivery_timeout: float = 10.0
+    ):
+        self._topic = topic
+        self._producer = producer
+        self._delays = delays
+        self._delivery_timeout = delivery_timeout
+
+    @property
+    def retry_topics(self) -> List[str]:
+        return [
+            f'{self._topic}.RETRY.{attempt}'
+            for attempt in range(1, len(self._delays) + 1)
+        ]
+
+    @property
+    def dead_letter_topic(self) -> str:
+        return f'{self._topic}.DLQ'
+
+    def delay(self, msg) -> float:
+        not_before = _headers(msg).get(NOT_BEFORE)
+
+        if not_before is None:
+            return 0
+
+        return max(0, (int(not_before) - _now_ms()) / 1000)
+
+    def forward(self, msg, error: Exception):
+        headers = _headers(msg)
+        attempt = int(headers.get(ATTEMPT, '0')) + 1
+        retryable = not isinstance(error, _non_retryable)
+
+        if retryable and attempt <= len(self._delays):
+            topic = self.retry_topics[attempt - 1]
+            not_before = _now_ms() + int(self._delays[attempt - 1] * 1000)
+            headers[NOT_BEFORE] = str(not_before)
+            metrics.counter(
+                'kafka_retries_total',
+                topic=self._topic,
+                tier=str(attempt)
+            ).inc()
+        else:
+            topic = self.dead_letter_topic
+            headers.pop(NOT_BEFORE, None)
+            metrics.counter(
+                'kafka_dead_letters_total',
+                topic=self._topic,
+                reason='exhausted' if retryable else 'non_retryable'
+            ).inc()
+
+        headers.update({
+            ORIGINAL_TOPIC: self._topic,
+            ATTEMPT: str(attempt),
+            ERROR_TYPE: type(error).__name__,
+            ERROR_MESSAGE: str(error)[:1024],
+            FAILED_AT: str(_now_ms()),
+            SOURCE: f'{msg.topic()}:{msg.partition()}:{msg.offset()}'
+        })
+
+        _log.warning(
+            f'Forwarding message {msg.topic()}:{msg.partition()}:'
+            f'{msg.offset()} to {topic} after {type(error).__name__}: '
+            f'{error}'
+        )
+        future = self._producer.produce(
+            topic,
+            msg.value(),
+            key=msg.key(),
+            headers=list(headers.items())
+        )
+        future.result(self._delivery_timeout)
+
+
+def _assign_backlog(
+    consumer: Consumer,
+    topic: str,
+    timeout: float
+) -> Dict[int, int]:
+    metadata = consumer.list_topics(topic, timeout)
+    partitions = [
+        TopicPartition(topic, p)
+        for p in metadata.topics[topic].partitions
+    ]
+    committed = consumer.committed(partitions, timeout)
+    starts, ends = [], {}
+
+    for tp in committed:
+        low, high = consumer.get_watermark_offsets(tp, timeout=timeout)
+        start = tp.offset if tp.offset >= 0 else low
+
+        if start < high:
+            starts.append(TopicPartition(topic, tp.partition, start))
+            ends[tp.partition] = high
+
+    consumer.assign(starts)
+
+    return ends
+
+
+def replay_dead_letters(
+    config: dict,
+    producer: AsyncProducer,
+    topic: str,
+    limit: int = None,
+    timeout: float = 5.0
+) -> int:
+    dead_letter_topic = f'{topic}.DLQ'
+    consumer = Consumer({
+        **config,
+        'group.id': f'{config["group.id"]}.DLQ-REPLAY',
+        'enable.auto.commit': False,
+        'enable.auto.offset.store': False,
+        'enable.partition.eof': True
+    })
+    replayed = 0
+
+    try:
+        pending = _assign_backlog(consumer, dead_letter_topic, timeout)
+
+        while pending and (limit is None or replayed < limit):
+            msg = consumer.poll(timeout)
+
+            if msg is None:
+                continue
+
+            if msg.error():
+                if msg.error().code() != KafkaError._PARTITION_EOF:
+                    raise KafkaException(msg.error())
+
+                pending.pop(msg.partition(), None)
+                continue
+
+            end = pending.get(msg.partition())
+
+            if end is None or msg.offset() >= end:
+                pending.pop(msg.partition(), None)
+                continue
+
+            if msg.offset() + 1 >= end:
+                pending.pop(msg.partition(), None)
+
+            headers = [
+                (key, value)
+                for key, value in (msg.headers() or [])
+                if key not in _retry_headers
+            ]
+            original = _headers(msg).get(ORIGINAL_TOPIC, topic)
+            producer.produce(
+                original,
+                msg.value(),
+                key=msg.key(),
+                headers=headers
+            ).result(timeout)
+            consumer.store_offsets(message=msg)
+            replayed += 1
+    finally:
+        try:
+            consumer.commit(asynchronous=False)
+        except KafkaException as e:
+            if e.args[0].code() != KafkaError._NO_OFFSET:
+                raise
+        finally:
+            consumer.close()
+
+    _log.info(f'Replayed {replayed} messages from {dead_letter_topic}')
+    return replayed
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from infrastructure.database import get_database
+from infrastructure.repository import TokenRepository
+
+
+def _format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+
+        size /= 1024
+
+    return f'{size:.1f} TB'
+
+
+def maintain_tokens(
+    config,
+    used_for: int,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    echo=print
+) -> int:
+    db = get_database(config.MONGODB_SETTINGS)
+    token_repo = TokenRepository(db)
+    token_repo.create_indexes(config.TOKENS['ttl_grace'])
+
+    stats = token_repo.stats()
+    echo(
+        f'tokens: {stats["count"]} documents, '
+        f'{_format_size(stats["size"])} data, '
+        f'{_format_size(stats["storage_size"])} storage, '
+        f'{_format_size(stats["total_index_size"])} indexes'
+    )
+
+    for name, size in stats['index_sizes'].items():
+        echo(f'  {name}: {_format_size(size)}')
+
+    if dry_run:
+        return 0
+
+    used_before = datetime.utcnow() - timedelta(seconds=used_for)
+    deleted = token_repo.purge_used(used_before, batch_size)
+    echo(f'Purged {deleted} used tokens')
+
+    return deleted
+
+
+def migrate_token_keys(config, batch_size: int = 1000, echo=print) -> int:
+    db = get_database(config.MONGODB_SETTINGS)
+    token_repo = TokenRepository(db)
+    migrated = token_repo.migrate_keys(batch_size)
+    echo(f'Migrated {migrated} tokens to binary keys')
+
+    return migrated
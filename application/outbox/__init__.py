@@ -0,0 +1,39 @@
+import signal
+
+from infrastructure.database import get_database
+from infrastructure.producer import AsyncProducer
+from infrastructure.repository import OutboxRepository
+from .relay import OutboxRelay
+
+
+def start_relay(config):
+    db = get_database(config.MONGODB_SETTINGS)
+    outbox = OutboxRepository(db)
+    outbox.create_indexes(config.OUTBOX['retention'])
+
+    producer = AsyncProducer('outbox', {
+        'bootstrap.servers': config.KAFKA_SERVER,
+        'client.id': 'AUTH',
+        'enable.idempotence': True,
+        'message.max.bytes': 32 * 1024 ** 2
+    }, **config.KAFKA_PRODUCER)
+
+    relay = OutboxRelay(
+        outbox,
+        producer,
+        batch_size=config.OUTBOX['batch_size'],
+        poll_interval=config.OUTBOX['poll_interval'],
+        max_attempts=config.OUTBOX['max_attempts'],
+        change_stream=config.OUTBOX['change_stream'],
+        lease=config.OUTBOX['lease']
+    )
+
+    def shutdown(*_):
+        relay.stop()
+
+    signal.signal(signal.SIGHUP, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    relay.run()
+    producer.close()
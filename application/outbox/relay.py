@@ -0,0 +1,142 @@
+import logging
+import time
+from pymongo.errors import PyMongoError
+
+from domain.util import metrics
+from infrastructure.producer import AsyncProducer
+from infrastructure.repository import OutboxRepository
+
+
+_log = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        outbox: OutboxRepository,
+        producer: AsyncProducer,
+        batch_size: int = 500,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        change_stream: bool = False,
+        lease: float = 60.0
+    ):
+        self._outbox = outbox
+        self._producer = producer
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._change_stream = change_stream
+        self._lease = lease
+        self._stream = None
+        self._running = False
+        self._sent = metrics.counter('outbox_sent_total')
+        self._failed = metrics.counter('outbox_failed_total')
+        self._exhausted = metrics.counter('outbox_exhausted_total')
+        self._exhausted_pending = metrics.gauge('outbox_exhausted_events')
+
+    def _publish_batch(self) -> int:
+        events = self._outbox.claim_pending(
+            self._batch_size,
+            self._max_attempts,
+            self._lease
+        )
+
+        if not events:
+            return 0
+
+        futures = [
+            (
+                event['_id'],
+                self._producer.produce(
+                    event['topic'],
+                    event['payload'],
+                    key=event['key'],
+                    headers={'dedupe-key': event['_id']}
+                )
+            )
+            for event in events
+        ]
+
+        self._producer.flush()
+
+        sent, failed = [], []
+
+        for _id, future in futures:
+            if future.done() and future.exception() is None:
+                sent.append(_id)
+            else:
+                failed.append(_id)
+
+        self._outbox.mark_sent(sent)
+        exhausted = self._outbox.mark_failed(failed, self._max_attempts)
+        self._sent.inc(len(sent))
+        self._failed.inc(len(failed))
+
+        if failed:
+            _log.warning(f'{len(failed)} outbox events were not delivered')
+
+        if exhausted:
+            self._exhausted.inc(len(exhausted))
+            self._report_exhausted()
+            _log.error(
+                f'{len(exhausted)} outbox events reached {self._max_attempts} '
+                f'attempts and will not be retried: {", ".join(exhausted)}'
+            )
+
+        return len(events)
+
+    def _report_exhausted(self) -> int:
+        count = self._outbox.count_exhausted(self._max_attempts)
+        self._exhausted_pending.set(count)
+        return count
+
+    def _wait(self):
+        if not self._change_stream:
+            time.sleep(self._poll_interval)
+            return
+
+        try:
+            if self._stream is None:
+                self._stream = self._outbox.watch_inserts(
+                    int(self._poll_interval * 1000)
+                )
+
+            self._stream.try_next()
+        except PyMongoError as e:
+            _log.warning(f'Change stream unavailable, polling instead: {e}')
+            self._change_stream = False
+            self._stream = None
+
+    def run(self):
+        self._running = True
+        _log.info('Outbox relay started')
+
+        try:
+            exhausted = self._report_exhausted()
+
+            if exhausted:
+                _log.error(
+                    f'{exhausted} outbox events exhausted their attempts '
+                    'and are not being relayed'
+                )
+        except PyMongoError as e:
+            _log.error(f'Unable to read the outbox: {e}')
+
+        while self._running:
+            try:
+                count = self._publish_batch()
+            except PyMongoError as e:
+                _log.error(f'Unable to read the outbox: {e}')
+                count = 0
+
+            if count < self._batch_size and self._running:
+                self._wait()
+
+        if self._stream is not None:
+            self._stream.close()
+
+        _log.info('Outbox relay finished')
+
+    def stop(self):
+        self._running = False
@@ -1,12 +1,59 @@
+import logging
+import time
+
+from domain.util import metrics
+from infrastructure.producer import AsyncProducer
 from .gunicorn import GunicornApplication
-from .server import create_server
+from .server import create_indexes, create_server
 
 
-def start_flask_server(config, host: str, port: int):
-    create_server(config).run(host=host, port=port)
+_log = logging.getLogger(__name__)
+
+
+def _post_fork(server, worker):
+    worker.boot_started_at = time.monotonic()
+
+
+def _post_worker_init(worker):
+    try:
+        worker.wsgi.extensions['warm_up']()
+    except Exception as e:
+        _log.warning(f'Worker {worker.pid} warm-up failed: {e}')
 
+    elapsed = time.monotonic() - worker.boot_started_at
+    metrics.gauge('worker_boot_seconds').set(elapsed)
+    _log.info(f'Worker {worker.pid} booted in {elapsed:.3f}s')
 
-def start_gunicorn_server(config, host: str, port: int, workers: int):
+
+def _on_worker_exit(server, worker):
+    AsyncProducer.close_all()
+
+
+def start_flask_server(config, host: str, port: int):
+    create_indexes(config)
     server = create_server(config)
-    options = {'bind': f'{host}:{port}', 'workers': workers, 'timeout': 0}
-    GunicornApplication(server, options).run()
+    server.extensions['warm_up']()
+    server.run(host=host, port=port)
+
+
+def start_gunicorn_server(
+    config,
+    host: str,
+    port: int,
+    workers: int,
+    preload_app: bool = True
+):
+    create_indexes(config)
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'timeout': 0,
+        'post_fork': _post_fork,
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _on_worker_exit
+    }
+    GunicornApplication(
+        lambda: create_server(config),
+        options,
+        preload_app
+    ).run()
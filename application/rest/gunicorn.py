@@ -1,10 +1,17 @@
+from typing import Any, Callable
 from gunicorn.app.base import BaseApplication
 
 
 class GunicornApplication(BaseApplication):
-    def __init__(self, app, options=None):
-        self.options = options or {}
-        self.application = app
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        options=None,
+        preload_app: bool = True
+    ):
+        self.options = {**(options or {}), 'preload_app': preload_app}
+        self.factory = factory
+        self.application = None
         super().__init__()
 
     def load_config(self):
@@ -17,4 +24,7 @@ class GunicornApplication(BaseApplication):
             self.cfg.set(key.lower(), value)
 
     def load(self):
+        if self.application is None:
+            self.application = self.factory()
+
         return self.application
@@ -5,6 +5,7 @@ from . import users
 from . import groups
 from . import roles
 from . import settings
+from . import metrics
 
 
 __all__ = [
@@ -14,5 +15,6 @@ __all__ = [
     'users',
     'groups',
     'roles',
-    'settings'
+    'settings',
+    'metrics'
 ]
@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from domain.util import metrics
+
+
+def get_blueprint() -> Blueprint:
+    bp = Blueprint('Metrics', __name__)
+
+    @bp.get('/metrics')
+    def get_all():
+        return Response(metrics.registry.render(), mimetype='text/plain')
+
+    return bp
@@ -1,4 +1,5 @@
 from .authorization import Authorization
 from .roles import Role
+from .verifier import JwtVerifier
 
-__all__ = ['Authorization', 'Role']
+__all__ = ['Authorization', 'JwtVerifier', 'Role']
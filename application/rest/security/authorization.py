@@ -4,14 +4,24 @@ from functools import wraps
 from keycloak import KeycloakOpenID
 from typing import Optional
 
+from domain.util.cache import IntrospectionCache
 from .roles import Role
 from .user_info import UserInfo
+from .verifier import JwtVerifier
 
 
 class Authorization:
-    def __init__(self, openid: KeycloakOpenID, enabled: bool = True):
+    def __init__(
+        self,
+        openid: KeycloakOpenID,
+        enabled: bool = True,
+        verifier: Optional[JwtVerifier] = None,
+        cache: Optional[IntrospectionCache] = None
+    ):
         self._openid = openid
         self._is_enabled = enabled
+        self._verifier = verifier
+        self._cache = cache
         self._global_granted_roles = []
 
     def _send_error(self, message: str, status: HTTPStatus):
@@ -26,7 +36,10 @@ class Authorization:
         return token
 
     def _introspect_token(self, token: str) -> Optional[UserInfo]:
-        data = self._openid.introspect(token)
+        if self._cache is not None:
+            data = self._cache.introspect(token, self._openid.introspect)
+        else:
+            data = self._openid.introspect(token)
 
         if not data.get('active'):
             return None
@@ -38,6 +51,12 @@ class Authorization:
             roles=data['realm_access']['roles']
         )
 
+    def _verify_token(self, token: str) -> Optional[UserInfo]:
+        if self._verifier is not None:
+            return self._verifier.verify(token)
+
+        return self._introspect_token(token)
+
     def _is_user_access_granted(self, user: UserInfo, *granted: Role) -> bool:
         all_granted_roles = [
             *self._global_granted_roles,
@@ -58,7 +77,7 @@ class Authorization:
         if token is None:
             self._send_error('Missing bearer token', HTTPStatus.UNAUTHORIZED)
 
-        user = self._introspect_token(token)
+        user = self._verify_token(token)
 
         if user is None:
             self._send_error('Access denied', HTTPStatus.UNAUTHORIZED)
@@ -0,0 +1,131 @@
+import logging
+import time
+from threading import Lock, Thread
+from typing import List, Optional
+from jose import jwt, JWTError
+from keycloak import KeycloakOpenID
+
+from .user_info import UserInfo
+
+
+_log = logging.getLogger(__name__)
+
+
+class JwtVerifier:
+    def __init__(
+        self,
+        openid: KeycloakOpenID,
+        audience: Optional[str] = None,
+        algorithms: List[str] = None,
+        refresh_interval: float = 3600,
+        min_refresh_interval: float = 30
+    ):
+        self._openid = openid
+        self._audience = audience
+        self._algorithms = algorithms or ['RS256']
+        self._refresh_interval = refresh_interval
+        self._min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._issuer = None
+        self._attempted_at = None
+        self._lock = Lock()
+        self._refresh_lock = Lock()
+        self._thread = None
+
+    def _load_keys(self):
+        issuer = self._openid.well_know()['issuer']
+        keys = {
+            key['kid']: key
+            for key in self._openid.certs().get('keys', [])
+            if key.get('use', 'sig') == 'sig'
+        }
+
+        with self._lock:
+            self._issuer = issuer
+            self._keys = keys
+
+        _log.debug(f'Loaded {len(keys)} realm signing keys')
+
+    def _refresh(self, force: bool = False) -> bool:
+        with self._refresh_lock:
+            now = time.monotonic()
+            throttled = (
+                self._attempted_at is not None and
+                now - self._attempted_at < self._min_refresh_interval
+            )
+
+            if throttled and not force:
+                return False
+
+            self._attempted_at = now
+
+            try:
+                self._load_keys()
+                return True
+            except Exception as e:
+                _log.error(f'Unable to load realm signing keys: {e}')
+                return False
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self._refresh_interval)
+            self._refresh(force=True)
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._thread = Thread(target=self._refresh_loop, daemon=True)
+            self._thread.start()
+
+    def _get_key(self, kid: str) -> Optional[dict]:
+        if not self._keys:
+            self._refresh()
+
+        key = self._keys.get(kid)
+
+        if key is None and self._refresh():
+            key = self._keys.get(kid)
+
+        return key
+
+    def verify(self, token: str) -> Optional[UserInfo]:
+        self._ensure_started()
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            return None
+
+        key = self._get_key(header.get('kid'))
+
+        if key is None:
+            _log.warning(f'Unknown signing key {header.get("kid")}')
+            return None
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=self._algorithms,
+                audience=self._audience,
+                issuer=self._issuer,
+                options={
+                    'verify_aud': self._audience is not None,
+                    'verify_at_hash': False
+                }
+            )
+        except JWTError as e:
+            _log.debug(f'Rejected token: {e}')
+            return None
+
+        return UserInfo(
+            username=claims.get('preferred_username'),
+            active=True,
+            email_verified=claims.get('email_verified', False),
+            roles=claims.get('realm_access', {}).get('roles', [])
+        )
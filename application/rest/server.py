@@ -1,19 +1,31 @@
-from flask import Flask
+import logging
+import os
+import time
+from flask import Flask, g
 from flask_cors import CORS
+from pymongo.errors import PyMongoError
 
 from domain.service import (
     AuthService,
     AccountService,
     SettingsService,
-    RegistrationService
+    RegistrationService,
+    TokenService
 )
+from domain.util.cache import IntrospectionCache
+from domain.util.metrics import gauge
+from domain.util.signing import Signer, parse_keys
 from infrastructure.database import get_database
 from infrastructure.keycloak import Keycloak
 from infrastructure.repository import (
     SecurityRepository,
     TokenRepository,
     Notifier,
-    ProtocolPublisher
+    HttpNotifier,
+    OutboxNotifier,
+    OutboxRepository,
+    ProtocolPublisher,
+    OutboxProtocolPublisher
 )
 from .resource import (
     docs,
@@ -22,14 +34,48 @@ from .resource import (
     users,
     groups,
     roles,
-    settings
+    settings,
+    metrics
 )
 from .encoder import CustomJsonEncoder
 from .error import error_bp
-from .security import Authorization, Role
+from .security import Authorization, JwtVerifier, Role
 
 
 URL_PREFIX = '/api/v1/auth'
+_log = logging.getLogger(__name__)
+
+
+def _track_first_request(app: Flask):
+    served = set()
+
+    @app.before_request
+    def start_timer():
+        if os.getpid() not in served:
+            g.first_request_started_at = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        started_at = g.pop('first_request_started_at', None)
+
+        if started_at is not None and os.getpid() not in served:
+            served.add(os.getpid())
+            elapsed = time.perf_counter() - started_at
+            gauge('first_request_seconds').set(elapsed)
+            _log.info(f'First request served in {elapsed:.3f}s')
+
+        return response
+
+
+def create_indexes(config):
+    db = get_database(config.MONGODB_SETTINGS)
+
+    try:
+        TokenRepository(db).create_indexes(config.TOKENS['ttl_grace'])
+    except PyMongoError as e:
+        _log.error(f'Unable to create token indexes: {e}')
+    finally:
+        db.client.close()
 
 
 def create_server(config):
@@ -43,33 +89,81 @@ def create_server(config):
     CORS(app)
 
     keycloak = Keycloak(**config.KEYCLOAK_SETTINGS)
-    security_repo = SecurityRepository(keycloak)
+    security_repo = SecurityRepository(
+        keycloak,
+        config.REALM_CATALOG_REFRESH
+    )
     db = get_database(config.MONGODB_SETTINGS)
 
     is_auth_enabled = config.FLASK_ENV != 'development'
-    auth = Authorization(keycloak.cli_openid, is_auth_enabled)
+    verifier = None
+
+    if config.TOKEN_VERIFICATION['mode'] == 'local':
+        verifier = JwtVerifier(
+            keycloak.cli_openid,
+            audience=config.TOKEN_VERIFICATION['audience'],
+            refresh_interval=config.TOKEN_VERIFICATION['refresh_interval']
+        )
+
+    introspection_cache = IntrospectionCache(**config.INTROSPECTION_CACHE)
+    auth = Authorization(
+        keycloak.cli_openid,
+        is_auth_enabled,
+        verifier,
+        introspection_cache
+    )
     auth.grant_role_for_any_request(Role.ADMIN)
 
-    notifier = Notifier({
-        'bootstrap.servers': config.KAFKA_SERVER,
-        'client.id': 'AUTH',
-        'message.max.bytes': 32 * 1024 ** 2
-    }, config.TEMPLATES, config.URLS)
-
-    protocol_pub = ProtocolPublisher({
-        'bootstrap.servers': config.KAFKA_SERVER,
-        'client.id': 'AUTH'
-    })
+    outbox = OutboxRepository(db)
+
+    if config.OUTBOX['enabled']:
+        notifier = OutboxNotifier(outbox, config.TEMPLATES, config.URLS)
+    elif config.NOTIFIER_BACKEND == 'http':
+        notifier = HttpNotifier(
+            config.TEMPLATES,
+            config.URLS,
+            **config.HTTP_NOTIFIER
+        )
+    else:
+        notifier = Notifier({
+            'bootstrap.servers': config.KAFKA_SERVER,
+            'client.id': 'AUTH',
+            'message.max.bytes': 32 * 1024 ** 2
+        }, config.TEMPLATES, config.URLS, config.KAFKA_PRODUCER)
+
+    if config.OUTBOX['enabled']:
+        protocol_pub = OutboxProtocolPublisher(outbox)
+    else:
+        protocol_pub = ProtocolPublisher(
+            {
+                'bootstrap.servers': config.KAFKA_SERVER,
+                'client.id': 'AUTH',
+                'linger.ms': config.PROTOCOL_PUBLISHER['linger_ms'],
+                'batch.num.messages': config.PROTOCOL_PUBLISHER['batch_size']
+            },
+            config.KAFKA_PRODUCER,
+            config.PROTOCOL_PUBLISHER['asynchronous'],
+            config.PROTOCOL_PUBLISHER['delivery_timeout']
+        )
 
     token_repo = TokenRepository(db)
+    signer = None
+
+    if config.TOKENS['format'] == 'signed':
+        signer = Signer(
+            parse_keys(config.TOKENS['signing_keys']),
+            config.TOKENS['active_key']
+        )
+
+    token_svc = TokenService(token_repo, signer)
     account_svc = AccountService(
         security_repo,
-        token_repo,
+        token_svc,
         notifier,
         protocol_pub
     )
 
-    auth_svc = AuthService(security_repo)
+    auth_svc = AuthService(security_repo, introspection_cache)
     session_bp = session.get_blueprint(auth_svc)
     app.register_blueprint(session_bp, url_prefix=URL_PREFIX)
 
@@ -89,8 +183,18 @@ def create_server(config):
     auth.require_authorization_for_any_request(settings_bp)
     app.register_blueprint(settings_bp, url_prefix=URL_PREFIX)
 
-    owner_reg_svc = RegistrationService(notifier, security_repo, token_repo)
+    metrics_bp = metrics.get_blueprint()
+    auth.require_authorization_for_any_request(metrics_bp)
+    app.register_blueprint(metrics_bp, url_prefix=URL_PREFIX)
+
+    owner_reg_svc = RegistrationService(notifier, security_repo, token_svc)
     registration_bp = registration.get_blueprint(owner_reg_svc)
     app.register_blueprint(registration_bp, url_prefix=URL_PREFIX)
 
+    def warm_up():
+        security_repo.load_catalog()
+
+    app.extensions['warm_up'] = warm_up
+    _track_first_request(app)
+
     return app
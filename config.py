@@ -7,10 +7,49 @@ import logging.config
 dotenv.load_dotenv()
 
 
+def _getbool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() == 'true'
+
+
 class Config:
     LOG_DIR = os.getenv('LOG_DIR', './logs')
     KAFKA_SERVER = os.getenv('KAFKA_SERVER')
     FLASK_ENV = os.getenv('FLASK_ENV')
+    KAFKA_CONSUMER = {
+        'batch_size': int(os.getenv('KAFKA_BATCH_SIZE', '1')),
+        'commit_interval': float(os.getenv('KAFKA_COMMIT_INTERVAL', '5')),
+        'commit_every': int(os.getenv('KAFKA_COMMIT_EVERY', '500')),
+        'workers': int(os.getenv('KAFKA_WORKERS', '0')),
+        'queue_size': int(os.getenv('KAFKA_WORKER_QUEUE_SIZE', '100')),
+        'coalesce_keys': _getbool('KAFKA_COALESCE_KEYS', True),
+        'drain_timeout': float(os.getenv('KAFKA_DRAIN_TIMEOUT', '30'))
+    }
+    KAFKA_ASSIGNMENT_STRATEGY = os.getenv(
+        'KAFKA_ASSIGNMENT_STRATEGY',
+        'cooperative-sticky'
+    )
+    KAFKA_RETRY = {
+        'enabled': _getbool('KAFKA_RETRY_ENABLED', True),
+        'delays': [
+            float(delay) for delay in
+            os.getenv('KAFKA_RETRY_DELAYS', '10,60,600').split(',')
+            if delay.strip()
+        ]
+    }
+    KAFKA_LEDGER = {
+        'enabled': _getbool('KAFKA_LEDGER_ENABLED', False),
+        'retention': int(os.getenv('KAFKA_LEDGER_RETENTION', str(7 * 86400)))
+    }
+    KAFKA_METRICS = {
+        'host': os.getenv('KAFKA_METRICS_HOST', '0.0.0.0'),  # nosec
+        'port': int(os.getenv('KAFKA_METRICS_PORT', '9100')),
+        'stats_interval_ms': int(os.getenv('KAFKA_STATS_INTERVAL_MS', '15000'))
+    }
+    KAFKA_PRODUCER = {
+        'queue_size': int(os.getenv('KAFKA_PRODUCER_QUEUE_SIZE', '10000')),
+        'queue_policy': os.getenv('KAFKA_PRODUCER_QUEUE_POLICY', 'block'),
+        'drain_timeout': float(os.getenv('KAFKA_PRODUCER_DRAIN_TIMEOUT', '10'))
+    }
     KEYCLOAK_SETTINGS = {
         'server': os.environ['KEYCLOAK_BASE_PATH'],
         'realm': os.environ['KEYCLOAK_REALM'],
@@ -18,6 +57,49 @@ class Config:
         'client_secret': os.environ['KEYCLOAK_CLIENT_SECRET'],
         'username': os.environ['KEYCLOAK_USERNAME'],
         'password': os.environ['KEYCLOAK_PASSWORD'],
+        'pool_size': int(os.getenv('KEYCLOAK_POOL_SIZE', '8')),
+        'timeout': float(os.getenv('KEYCLOAK_TIMEOUT', '10'))
+    }
+    REALM_CATALOG_REFRESH = float(os.getenv('REALM_CATALOG_REFRESH', '300'))
+    PROTOCOL_PUBLISHER = {
+        'asynchronous': _getbool('PROTOCOL_ASYNC', True),
+        'delivery_timeout': float(os.getenv('PROTOCOL_TIMEOUT', '10')),
+        'linger_ms': int(os.getenv('PROTOCOL_LINGER_MS', '20')),
+        'batch_size': int(os.getenv('PROTOCOL_BATCH_SIZE', '1000'))
+    }
+    NOTIFIER_BACKEND = os.getenv('NOTIFIER_BACKEND', 'kafka')
+    HTTP_NOTIFIER = {
+        'pool_size': int(os.getenv('NOTIFIER_POOL_SIZE', '10')),
+        'connect_timeout': float(os.getenv('NOTIFIER_CONN_TIMEOUT', '3.05')),
+        'read_timeout': float(os.getenv('NOTIFIER_READ_TIMEOUT', '10')),
+        'retries': int(os.getenv('NOTIFIER_RETRIES', '3')),
+        'backoff': float(os.getenv('NOTIFIER_BACKOFF', '0.5')),
+        'fire_and_forget': _getbool('NOTIFIER_ASYNC', False)
+    }
+    OUTBOX = {
+        'enabled': _getbool('OUTBOX_ENABLED', False),
+        'batch_size': int(os.getenv('OUTBOX_BATCH_SIZE', '500')),
+        'poll_interval': float(os.getenv('OUTBOX_POLL_INTERVAL', '1')),
+        'max_attempts': int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10')),
+        'retention': int(os.getenv('OUTBOX_RETENTION', str(7 * 24 * 3600))),
+        'change_stream': _getbool('OUTBOX_CHANGE_STREAM', False),
+        'lease': float(os.getenv('OUTBOX_LEASE', '60'))
+    }
+    TOKEN_VERIFICATION = {
+        'mode': os.getenv('TOKEN_VERIFICATION_MODE', 'introspection'),
+        'audience': os.getenv('TOKEN_AUDIENCE') or None,
+        'refresh_interval': int(os.getenv('JWKS_REFRESH_INTERVAL', '3600'))
+    }
+    INTROSPECTION_CACHE = {
+        'maxsize': int(os.getenv('INTROSPECTION_CACHE_SIZE', '10000')),
+        'ttl': float(os.getenv('INTROSPECTION_CACHE_TTL', '60')),
+        'negative_ttl': float(os.getenv('INTROSPECTION_NEGATIVE_TTL', '5'))
+    }
+    TOKENS = {
+        'ttl_grace': int(os.getenv('TOKEN_TTL_GRACE', str(24 * 3600))),
+        'format': os.getenv('TOKEN_FORMAT', 'database'),
+        'signing_keys': os.getenv('TOKEN_SIGNING_KEYS', ''),
+        'active_key': os.getenv('TOKEN_ACTIVE_KEY') or None
     }
     MONGODB_SETTINGS = {
         'db': os.environ['MONGO_DB'],
@@ -2,7 +2,7 @@ from .jwt import Jwt
 from .user import User, UserSummary, RequiredAction
 from .group import GroupSummary, Group
 from .role import Role
-from .token import Token
+from .token import Token, TokenStatus
 from .owner import Owner
 
 
@@ -15,5 +15,6 @@ __all__ = [
     'RequiredAction',
     'Role',
     'Token',
+    'TokenStatus',
     'Owner'
 ]
@@ -1,11 +1,20 @@
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from enum import Enum
 from typing import Optional
 
 from domain.util import text
 from .model import Model
 
 
+class TokenStatus(Enum):
+    VALID = 'VALID'
+    INVALID = 'INVALID'
+    USED = 'USED'
+    EXPIRED = 'EXPIRED'
+    WRONG_ACTION = 'WRONG_ACTION'
+
+
 @dataclass
 class Token(Model):
     _id: str
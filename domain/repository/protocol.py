@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 
 from ..model import Owner
 
 
 class IProtocolPublisher(ABC):
     @abstractmethod
-    def send_new_owner(self, owner: Owner):
+    def send_new_owner(self, owner: Owner) -> Future:
         pass
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Tuple
 
-from domain.model import Token
+from domain.model import Token, TokenStatus
 
 
 class ITokenRepository(ABC):
@@ -16,3 +17,24 @@ class ITokenRepository(ABC):
     @abstractmethod
     def update(self, token: Token) -> Token:
         pass
+
+    @abstractmethod
+    def consume(
+        self,
+        code: str,
+        action: str,
+        now: datetime
+    ) -> Tuple[TokenStatus, Optional[Token]]:
+        pass
+
+    @abstractmethod
+    def release(self, code: str, access_at: datetime):
+        pass
+
+    @abstractmethod
+    def mark_used(self, token: Token, now: datetime) -> bool:
+        pass
+
+    @abstractmethod
+    def unmark_used(self, token_id: str):
+        pass
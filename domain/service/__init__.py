@@ -2,11 +2,13 @@ from .account import AccountService
 from .auth import AuthService
 from .settings import SettingsService
 from .registration import RegistrationService
+from .token import TokenService
 
 
 __all__ = [
     'AccountService',
     'AuthService',
     'RegistrationService',
-    'SettingsService'
+    'SettingsService',
+    'TokenService'
 ]
@@ -1,9 +1,6 @@
 import logging
-import random
-import string
 from datetime import datetime, timedelta
-from hashlib import sha512
-from typing import List, Union
+from typing import List
 from uuid import uuid4
 
 from ..model import (
@@ -13,15 +10,16 @@ from ..model import (
     GroupSummary,
     Role,
     Token,
+    TokenStatus,
     Owner
 )
 from ..exception import AuthorizationError, UserError
 from ..repository import (
     ISecurityRepository,
-    ITokenRepository,
     INotifier,
     IProtocolPublisher
 )
+from .token import TokenService
 
 
 _log = logging.getLogger(__name__)
@@ -31,7 +29,7 @@ class AccountService:
     def __init__(
         self,
         security: ISecurityRepository,
-        tokens: ITokenRepository,
+        tokens: TokenService,
         notification_pub: INotifier,
         protocol_pub: IProtocolPublisher
     ):
@@ -40,43 +38,19 @@ class AccountService:
         self._notification_pub = notification_pub
         self._protocol_pub = protocol_pub
 
-    def _hash(self, code: Union[str, bytes]) -> str:
-        if isinstance(code, str):
-            code = code.encode('ascii')
-
-        return sha512(code).hexdigest()
-
     def _add_token(self, user_id: str, expire: timedelta, action: str) -> str:
-        code = ''.join(random.choices(
-            string.ascii_uppercase +
-            string.ascii_lowercase +
-            string.digits +
-            string.punctuation,
-            k=255
-        ))
-        now = datetime.utcnow()
-        token = Token(
-            _id=self._hash(code),
-            created_at=now,
-            expire_at=now + expire,
-            access_at=None,
-            user_id=user_id,
-            action=action
-        )
-
-        self._tokens.add(token)
-        return code
+        return self._tokens.issue(user_id, action, expire)
 
-    def _get_token(self, code: str, action: str) -> Token:
-        token = self._tokens.find_by_code(self._hash(code))
+    def _consume_token(self, code: bytes, action: str, now: datetime) -> Token:
+        status, token = self._tokens.consume(code, action, now)
 
-        if token is None:
+        if status == TokenStatus.INVALID:
             raise AuthorizationError('Invalid token')
 
-        if token.access_at or token.expire_at < datetime.now().astimezone():
+        if status in (TokenStatus.USED, TokenStatus.EXPIRED):
             raise AuthorizationError('Token is no longer valid')
 
-        if token.action != action:
+        if status == TokenStatus.WRONG_ACTION:
             raise AuthorizationError('Illegal requested action')
 
         return token
@@ -194,17 +168,21 @@ class AccountService:
         _log.debug(f'Email verification sent to {username}')
 
     def verify_email(self, code: bytes):
-        token = self._get_token(code, 'VERIFY_EMAIL')
-        token.access_at = datetime.utcnow()
-        self._tokens.update(token)
+        now = datetime.utcnow()
+        token = self._consume_token(code, 'VERIFY_EMAIL', now)
 
-        user = self._security.find_user_by_id(token.user_id)
-        user.emailVerified = True
+        try:
+            user = self._security.find_user_by_id(token.user_id)
+            user.emailVerified = True
 
-        if 'VERIFY_EMAIL' in user.requiredActions:
-            user.requiredActions.remove('VERIFY_EMAIL')
+            if 'VERIFY_EMAIL' in user.requiredActions:
+                user.requiredActions.remove('VERIFY_EMAIL')
+
+            self._security.update_user(user)
+        except Exception:
+            self._tokens.release(token, now)
+            raise
 
-        self._security.update_user(user)
         _log.debug(f'User\'s email {user.username} verified')
 
     def request_reset_password(self, username: str):
@@ -215,8 +193,13 @@ class AccountService:
         _log.debug(f'Sent reset password to {username}')
 
     def reset_password(self, password: str, code: bytes):
-        token = self._get_token(code, 'UPDATE_PASSWORD')
-        token.access_at = datetime.utcnow()
-        self._tokens.update(token)
-        self._security.set_password(token.user_id, password)
+        now = datetime.utcnow()
+        token = self._consume_token(code, 'UPDATE_PASSWORD', now)
+
+        try:
+            self._security.set_password(token.user_id, password)
+        except Exception:
+            self._tokens.release(token, now)
+            raise
+
         _log.debug(f'User {token.user_id} redefined the password')
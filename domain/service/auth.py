@@ -1,11 +1,19 @@
+from typing import Optional
+
 from domain.exception import AuthorizationError
 from ..model import Jwt, User
 from ..repository import ISecurityRepository
+from ..util.cache import IntrospectionCache
 
 
 class AuthService:
-    def __init__(self, auth_repo: ISecurityRepository):
+    def __init__(
+        self,
+        auth_repo: ISecurityRepository,
+        introspection_cache: Optional[IntrospectionCache] = None
+    ):
         self._auth_repo = auth_repo
+        self._introspection_cache = introspection_cache
 
     def login(self, username: str, password: str) -> Jwt:
         jwt = self._auth_repo.login(username, password)
@@ -21,7 +29,13 @@ class AuthService:
         return self._auth_repo.refresh_token(refresh_token)
 
     def introspect_token(self, access_token) -> str:
-        return self._auth_repo.introspect_token(access_token)
+        if self._introspection_cache is None:
+            return self._auth_repo.introspect_token(access_token)
+
+        return self._introspection_cache.introspect(
+            access_token,
+            self._auth_repo.introspect_token
+        )
 
     def _check_user_pre_conditions(self, user: User):
         if user.defaulting == 'true':
@@ -3,19 +3,16 @@ import pytz
 from datetime import datetime, timedelta
 from typing import Optional
 
-from domain.model import User, RequiredAction, Token
+from domain.model import User, RequiredAction, Token, TokenStatus
 from domain.exception import (
     AuthorizationError,
     UserError,
     UserNotFound,
     UserAlreadyActiveError
 )
-from domain.repository import (
-    ISecurityRepository,
-    ITokenRepository,
-    INotifier
-)
-from domain.util import text
+from domain.repository import ISecurityRepository, INotifier
+from domain.util import metrics, text
+from .token import TokenService
 
 
 class RegistrationService:
@@ -23,11 +20,11 @@ class RegistrationService:
         self,
         notifier: INotifier,
         security_repo: ISecurityRepository,
-        token_repo: ITokenRepository
+        tokens: TokenService
     ):
         self._notifier = notifier
         self._security_repo = security_repo
-        self._token_repo = token_repo
+        self._tokens = tokens
         self._log = logging.getLogger(self.__class__.__name__)
 
     def import_owner(self, owner: dict):
@@ -69,7 +66,21 @@ class RegistrationService:
         user.id = self._security_repo.create_user(user)
         self._log.debug(f'Added owner: (id={user.id}, doc={user.doc})')
 
+    def _is_owner_changed(self, owner: dict, user: User) -> bool:
+        return (
+            user.doc != owner['doc'] or
+            user.firstName != owner['first_name'] or
+            user.lastName != owner['last_name'] or
+            (user.email or '').lower() != (owner['email'] or '').lower() or
+            user.defaulting != owner['defaulting']
+        )
+
     def _update_owner_user(self, owner: dict, user: User):
+        if not self._is_owner_changed(owner, user):
+            metrics.counter('owner_updates_total', result='skipped').inc()
+            self._log.debug(f'Owner unchanged: (id={user.id}, doc={user.doc})')
+            return
+
         user.doc = owner['doc']
         user.firstName = owner['first_name']
         user.lastName = owner['last_name']
@@ -77,6 +88,7 @@ class RegistrationService:
         user.defaulting = owner['defaulting']
 
         self._security_repo.update_user(user)
+        metrics.counter('owner_updates_total', result='applied').inc()
         self._log.debug(f'Updated owner: (id={user.id}, doc={user.doc})')
 
     def request_owner_activation(self, doc: str) -> User:
@@ -88,59 +100,62 @@ class RegistrationService:
         if RequiredAction.VERIFY_EMAIL.value not in user.requiredActions:
             raise UserAlreadyActiveError('User email is already verified')
 
-        code, token = Token.new(
-            expire_in=timedelta(hours=1),
-            action='OWNER_REGISTRATION',
-            user_id=user.id
+        code = self._tokens.issue(
+            user.id,
+            'OWNER_REGISTRATION',
+            timedelta(hours=1)
         )
 
-        self._token_repo.add(token)
-        self._log.debug(f'Added token {token._id}')
-
         self._notifier.send_owner_email_verification(user, code)
         self._log.debug(f'Requested owner activation with doc: {user.doc}')
 
         return user
 
-    def activate_owner(self, code: str, password: str) -> User:
-        token = self._token_repo.find_by_code(text.sha512(code))
-        now = datetime.now(pytz.timezone('UTC'))
+    def _consume_token(self, code: str, action: str, now: datetime) -> Token:
+        status, token = self._tokens.consume(code, action, now)
 
-        if token is None:
+        if status == TokenStatus.INVALID:
             raise AuthorizationError('Token is invalid')
 
-        if token.access_at is not None:
+        if status == TokenStatus.USED:
             raise AuthorizationError('Token is no longer valid')
 
-        if now > token.expire_at:
+        if status == TokenStatus.EXPIRED:
             raise AuthorizationError('Token has expired')
 
-        if token.action != 'OWNER_REGISTRATION':
+        if status == TokenStatus.WRONG_ACTION:
             raise AuthorizationError('Illegal action requested for this token')
 
-        user = self._security_repo.find_user_by_id(token.user_id)
+        return token
 
-        if user is None:
-            raise UserError('User no longer exists')
+    def activate_owner(self, code: str, password: str) -> User:
+        now = datetime.now(pytz.timezone('UTC'))
+        token = self._consume_token(code, 'OWNER_REGISTRATION', now)
 
-        user.enabled = True
-        user.emailVerified = True
+        try:
+            user = self._security_repo.find_user_by_id(token.user_id)
 
-        if RequiredAction.VERIFY_EMAIL.value in user.requiredActions:
-            user.requiredActions.remove(RequiredAction.VERIFY_EMAIL.value)
+            if user is None:
+                raise UserError('User no longer exists')
 
-        if RequiredAction.UPDATE_PASSWORD.value in user.requiredActions:
-            user.requiredActions.remove(RequiredAction.UPDATE_PASSWORD.value)
+            user.enabled = True
+            user.emailVerified = True
 
-        self._security_repo.update_user(user)
-        self._security_repo.set_password(user.id, password)
-        self._log.debug(f'Activated owner: (id={user.id}, doc={user.doc})')
+            if RequiredAction.VERIFY_EMAIL.value in user.requiredActions:
+                user.requiredActions.remove(RequiredAction.VERIFY_EMAIL.value)
 
-        token.access_at = now
-        self._token_repo.update(token)
-        self._log.debug(
-            f'Accessed token: (id={token._id}, action={token.action})'
-        )
+            if RequiredAction.UPDATE_PASSWORD.value in user.requiredActions:
+                user.requiredActions.remove(
+                    RequiredAction.UPDATE_PASSWORD.value
+                )
+
+            self._security_repo.update_user(user)
+            self._security_repo.set_password(user.id, password)
+        except Exception:
+            self._tokens.release(token, now)
+            raise
+
+        self._log.debug(f'Activated owner: (id={user.id}, doc={user.doc})')
 
         return user
 
@@ -169,51 +184,37 @@ class RegistrationService:
         user.id = self._security_repo.create_user(user)
         self._log.debug(f'Added public user: (id={user.id}, doc={user.doc})')
 
-        code, token = Token.new(
-            expire_in=timedelta(hours=1),
-            action='USER_REGISTRATION',
-            user_id=user.id
+        code = self._tokens.issue(
+            user.id,
+            'USER_REGISTRATION',
+            timedelta(hours=1)
         )
-        self._token_repo.add(token)
         self._notifier.send_email_verification(user, code)
         self._log.debug(f'Requested user activation with doc: {user.doc}')
 
         return user
 
     def activate_public_user(self, code: str) -> User:
-        token = self._token_repo.find_by_code(text.sha512(code))
         now = datetime.now(pytz.timezone('UTC'))
+        token = self._consume_token(code, 'USER_REGISTRATION', now)
 
-        if token is None:
-            raise AuthorizationError('Token is invalid')
-
-        if token.access_at is not None:
-            raise AuthorizationError('Token is no longer valid')
-
-        if now > token.expire_at:
-            raise AuthorizationError('Token has expired')
-
-        if token.action != 'USER_REGISTRATION':
-            raise AuthorizationError('Illegal action requested for this token')
+        try:
+            user = self._security_repo.find_user_by_id(token.user_id)
 
-        user = self._security_repo.find_user_by_id(token.user_id)
+            if user is None:
+                raise UserError('User no longer exists')
 
-        if user is None:
-            raise UserError('User no longer exists')
+            user.enabled = True
+            user.emailVerified = True
 
-        user.enabled = True
-        user.emailVerified = True
+            if RequiredAction.VERIFY_EMAIL.value in user.requiredActions:
+                user.requiredActions.remove(RequiredAction.VERIFY_EMAIL.value)
 
-        if RequiredAction.VERIFY_EMAIL.value in user.requiredActions:
-            user.requiredActions.remove(RequiredAction.VERIFY_EMAIL.value)
+            self._security_repo.update_user(user)
+        except Exception:
+            self._tokens.release(token, now)
+            raise
 
-        self._security_repo.update_user(user)
         self._log.debug(f'Activated user: (id={user.id}, doc={user.doc})')
 
-        token.access_at = now
-        self._token_repo.update(token)
-        self._log.debug(
-            f'Accessed token: (id={token._id}, action={token.action})'
-        )
-
         return user
@@ -0,0 +1,107 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple, Union
+
+from domain.model import Token, TokenStatus
+from domain.repository import ITokenRepository
+from domain.util import metrics, text
+from domain.util.signing import Signer, generate_id
+
+
+_log = logging.getLogger(__name__)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+
+    return value.astimezone(timezone.utc)
+
+
+class TokenService:
+    def __init__(self, token_repo: ITokenRepository, signer: Signer = None):
+        self._token_repo = token_repo
+        self._signer = signer
+
+    def issue(self, user_id: str, action: str, expire_in: timedelta) -> str:
+        if self._signer is None:
+            code, token = Token.new(expire_in, user_id, action)
+            self._token_repo.add(token)
+            _log.debug(f'Added token {token._id}')
+
+            return code
+
+        now = datetime.now(timezone.utc)
+
+        return self._signer.sign({
+            'j': generate_id(),
+            'u': user_id,
+            'a': action,
+            'i': int(now.timestamp()),
+            'e': int((now + expire_in).timestamp())
+        })
+
+    def _decode(self, code: Union[str, bytes]) -> Optional[Token]:
+        if isinstance(code, bytes):
+            try:
+                code = code.decode('ascii')
+            except UnicodeDecodeError:
+                return None
+
+        claims = self._signer.verify(code)
+
+        if claims is None:
+            return None
+
+        try:
+            return Token(
+                _id=claims['j'],
+                created_at=datetime.fromtimestamp(claims['i'], timezone.utc),
+                expire_at=datetime.fromtimestamp(claims['e'], timezone.utc),
+                access_at=None,
+                user_id=claims['u'],
+                action=claims['a']
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def consume(
+        self,
+        code: Union[str, bytes],
+        action: str,
+        now: datetime
+    ) -> Tuple[TokenStatus, Optional[Token]]:
+        if self._signer is None:
+            status, token = self._token_repo.consume(
+                text.sha512(code),
+                action,
+                now
+            )
+        else:
+            token = self._decode(code)
+
+            if token is None:
+                status = TokenStatus.INVALID
+            elif token.expire_at <= _as_utc(now):
+                status = TokenStatus.EXPIRED
+            elif token.action != action:
+                status = TokenStatus.WRONG_ACTION
+            elif not self._token_repo.mark_used(token, now):
+                status = TokenStatus.USED
+            else:
+                status = TokenStatus.VALID
+
+        metrics.counter('tokens_consumed_total', status=status.value).inc()
+
+        if status == TokenStatus.VALID:
+            _log.debug(
+                f'Accessed token: (id={token._id}, action={token.action})'
+            )
+
+        return status, token
+
+    def release(self, token: Token, now: datetime):
+        if self._signer is None:
+            self._token_repo.release(token._id, now)
+        else:
+            self._token_repo.unmark_used(token._id)
@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from . import metrics, text
+from .singleflight import SingleFlight
+
+
+_MISSING = object()
+
+
+class TtlCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._hits = metrics.counter('cache_hits_total', cache=name)
+        self._misses = metrics.counter('cache_misses_total', cache=name)
+        self._evictions = metrics.counter('cache_evictions_total', cache=name)
+        self._size = metrics.gauge('cache_size', cache=name)
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+                self._size.set(len(self._entries))
+
+        self._misses.inc()
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self._evictions.inc()
+
+            self._size.set(len(self._entries))
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._size.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size.set(0)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self._maxsize,
+            'hits': self._hits.value,
+            'misses': self._misses.value,
+            'evictions': self._evictions.value
+        }
+
+
+class IntrospectionCache:
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 60,
+        negative_ttl: float = 5
+    ):
+        self._cache = TtlCache('introspection', maxsize, ttl)
+        self._negative_ttl = negative_ttl
+        self._flight = SingleFlight('introspection')
+
+    def _get_ttl(self, data: dict) -> float:
+        if not data.get('active'):
+            return self._negative_ttl
+
+        expire_at = data.get('exp')
+
+        if expire_at is None:
+            return self._cache.ttl
+
+        return expire_at - time.time()
+
+    def introspect(self, token: str, loader: Callable[[str], dict]) -> dict:
+        key = text.sha256(token)
+        data = self._cache.get(key, _MISSING)
+
+        if data is _MISSING:
+            data = self._flight.do(
+                ('introspect', key),
+                self._load,
+                key,
+                token,
+                loader
+            )
+
+        return data
+
+    def _load(self, key: str, token: str, loader: Callable[[str], dict]):
+        data = loader(token)
+        self._cache.set(key, data, self._get_ttl(data))
+        return data
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,184 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Tuple
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0
+        self._lock = Lock()
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def buckets(self) -> Dict[float, int]:
+        cumulative = {}
+        total = 0
+
+        with self._lock:
+            for bound, count in zip(self._buckets, self._counts):
+                total += count
+                cumulative[bound] = total
+
+            cumulative[float('inf')] = self._count
+
+        return cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get(self, kind: type, name: str, labels: dict, *args):
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            metric = self._metrics.get(key)
+
+            if metric is None:
+                metric = self._metrics[key] = kind(*args)
+            elif not isinstance(metric, kind):
+                raise ValueError(f'Metric {name} is not a {kind.__name__}')
+
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def histogram(
+        self,
+        name: str,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        **labels
+    ) -> Histogram:
+        return self._get(Histogram, name, labels, buckets)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = list(self._metrics.items())
+
+        result = {}
+
+        for (name, labels), metric in items:
+            entry = {'labels': dict(labels)}
+
+            if isinstance(metric, Histogram):
+                entry.update(count=metric.count, sum=metric.sum)
+            else:
+                entry.update(value=metric.value)
+
+            result.setdefault(name, []).append(entry)
+
+        return result
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+
+        lines = []
+        declared = set()
+
+        for (name, labels), metric in items:
+            if name not in declared:
+                kind = type(metric).__name__.lower()
+                lines.append(f'# TYPE {name} {kind}')
+                declared.add(name)
+
+            if isinstance(metric, Histogram):
+                for bound, count in metric.buckets().items():
+                    le = '+Inf' if bound == float('inf') else str(bound)
+                    bucket_labels = _format_labels(labels + (('le', le),))
+                    lines.append(f'{name}_bucket{bucket_labels} {count}')
+
+                suffix = _format_labels(labels)
+                lines.append(f'{name}_sum{suffix} {metric.sum}')
+                lines.append(f'{name}_count{suffix} {metric.count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {metric.value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+
+    pairs = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
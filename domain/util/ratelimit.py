@@ -0,0 +1,35 @@
+import time
+from threading import Lock
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError('"rate" must be greater than zero')
+
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated_at = time.monotonic()
+        self._lock = Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst,
+                self._tokens + (now - self._updated_at) * self._rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0
+
+            return -self._tokens / self._rate
+
+    def acquire(self):
+        delay = self._reserve()
+
+        if delay > 0:
+            time.sleep(delay)
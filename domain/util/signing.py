@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from typing import Dict, Optional
+
+
+_VERSION = 'v1'
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def generate_id(size: int = 12) -> str:
+    return _encode(os.urandom(size))
+
+
+def parse_keys(value: str) -> Dict[str, bytes]:
+    keys = {}
+
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        kid, _, secret = item.partition(':')
+
+        if not kid or not secret:
+            raise ValueError(f'Invalid signing key entry "{kid}"')
+
+        keys[kid] = secret.encode('utf-8')
+
+    return keys
+
+
+class Signer:
+    def __init__(self, keys: Dict[str, bytes], active: str = None):
+        if not keys:
+            raise ValueError('At least one signing key is required')
+
+        self._keys = keys
+        self._active = active or next(iter(keys))
+
+        if self._active not in keys:
+            raise ValueError(f'Unknown signing key {self._active}')
+
+    def _sign(self, kid: str, message: str) -> str:
+        digest = hmac.new(
+            self._keys[kid],
+            message.encode('ascii'),
+            hashlib.sha256
+        ).digest()
+
+        return _encode(digest)
+
+    def sign(self, claims: dict) -> str:
+        payload = _encode(
+            json.dumps(claims, separators=(',', ':')).encode('utf-8')
+        )
+        message = f'{_VERSION}.{self._active}.{payload}'
+
+        return f'{message}.{self._sign(self._active, message)}'
+
+    def verify(self, code: str) -> Optional[dict]:
+        try:
+            version, kid, payload, signature = code.split('.')
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+        if version != _VERSION or kid not in self._keys:
+            return None
+
+        expected = self._sign(kid, f'{version}.{kid}.{payload}')
+
+        if not hmac.compare_digest(expected, signature):
+            return None
+
+        try:
+            return json.loads(_decode(payload))
+        except ValueError:
+            return None
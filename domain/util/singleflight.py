@@ -0,0 +1,66 @@
+import copy
+from threading import Event, Lock
+from typing import Any, Callable, Hashable
+
+from . import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self._name = name
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        operation = key[0] if isinstance(key, tuple) else self._name
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+
+            if is_leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        metrics.counter(
+            'singleflight_calls_total',
+            group=self._name,
+            operation=operation
+        ).inc()
+
+        if not is_leader:
+            metrics.counter(
+                'singleflight_suppressed_total',
+                group=self._name,
+                operation=operation
+            ).inc()
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            if call.waiters:
+                call.result = copy.deepcopy(call.result)
+
+            call.done.set()
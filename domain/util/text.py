@@ -21,3 +21,10 @@ def sha512(code: Union[str, bytes]) -> str:
         code = code.encode('ascii')
 
     return hashlib.sha512(code).hexdigest()
+
+
+def sha256(code: Union[str, bytes]) -> str:
+    if isinstance(code, str):
+        code = code.encode('utf-8')
+
+    return hashlib.sha256(code).hexdigest()
@@ -0,0 +1,71 @@
+import logging
+import time
+from threading import Lock
+from typing import List, Optional
+from keycloak import KeycloakAdmin
+
+
+_log = logging.getLogger(__name__)
+
+
+class RealmCatalog:
+    def __init__(self, admin: KeycloakAdmin, refresh_interval: float = 300):
+        self._admin = admin
+        self._refresh_interval = refresh_interval
+        self._roles = {}
+        self._groups = {}
+        self._loaded_at = None
+        self._lock = Lock()
+
+    def _is_stale(self) -> bool:
+        return (
+            self._loaded_at is None or
+            time.monotonic() - self._loaded_at > self._refresh_interval
+        )
+
+    def _ensure_loaded(self):
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._load()
+
+    def _load(self):
+        self._roles = {
+            role['name']: role
+            for role in self._admin.get_realm_roles()
+        }
+        self._groups = {
+            group['name']: group
+            for group in self._admin.get_groups()
+        }
+        self._loaded_at = time.monotonic()
+        _log.debug(
+            f'Loaded realm catalog: {len(self._roles)} roles, '
+            f'{len(self._groups)} groups'
+        )
+
+    def load(self):
+        with self._lock:
+            self._load()
+
+    def refresh(self):
+        observed = self._loaded_at
+
+        with self._lock:
+            if self._loaded_at == observed:
+                self._load()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def find_role(self, name: str) -> Optional[dict]:
+        self._ensure_loaded()
+        return self._roles.get(name)
+
+    def find_group(self, name: str) -> Optional[dict]:
+        self._ensure_loaded()
+        return self._groups.get(name)
+
+    def group_names(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._groups)
@@ -1,8 +1,9 @@
 from pymongo import MongoClient
-from pymongo.database import Database
 
+from .provider import LazyDatabase, Provider
 
-def get_database(config: dict) -> Database:
+
+def get_database(config: dict) -> LazyDatabase:
     db = config['db']
     host = config.get('host', 'localhost')
     port = config.get('port', '27017')
@@ -12,5 +13,8 @@ def get_database(config: dict) -> Database:
 
     params = f'authSource={auth_source}'
     uri = f'mongodb://{username}:{password}@{host}:{port}/?{params}'
-    client = MongoClient(uri, tz_aware=True)
-    return client[db]
+
+    def connect():
+        return MongoClient(uri, tz_aware=True)[db]
+
+    return LazyDatabase(Provider(connect))
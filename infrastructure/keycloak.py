@@ -1,4 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, local
 from keycloak import KeycloakOpenID, KeycloakAdmin
+from keycloak.connection import ConnectionManager
+
+from domain.util.ratelimit import RateLimiter
+from .provider import Provider, Proxy
+
+
+_prepaid = local()
+
+
+class _RateLimitedConnection(ConnectionManager):
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        super().__init__(**kwargs)
+        self._limiter = limiter
+
+    def _acquire(self):
+        if getattr(_prepaid, 'request', False):
+            _prepaid.request = False
+        else:
+            self._limiter.acquire()
+
+    def raw_get(self, *args, **kwargs):
+        self._acquire()
+        return super().raw_get(*args, **kwargs)
+
+    def raw_post(self, *args, **kwargs):
+        self._acquire()
+        return super().raw_post(*args, **kwargs)
+
+    def raw_put(self, *args, **kwargs):
+        self._acquire()
+        return super().raw_put(*args, **kwargs)
+
+    def raw_delete(self, *args, **kwargs):
+        self._acquire()
+        return super().raw_delete(*args, **kwargs)
+
+
+class _RateLimitedExecutor:
+    def __init__(self, executor: ThreadPoolExecutor, limiter: RateLimiter):
+        self._executor = executor
+        self._limiter = limiter
+
+    def submit(self, fn, *args, **kwargs):
+        self._limiter.acquire()
+
+        def run():
+            _prepaid.request = True
+
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _prepaid.request = False
+
+        return self._executor.submit(run)
+
+    def __getattr__(self, name: str):
+        return getattr(self._executor, name)
+
+
+class _KeycloakAdmin(KeycloakAdmin):
+    def __init__(self, timeout: float, limiter: RateLimiter = None, **kwargs):
+        self._request_timeout = timeout
+        self._limiter = limiter
+        self._refresh_lock = Lock()
+        self._refreshed_at = 0
+        super().__init__(**kwargs)
+
+    def get_token(self):
+        super().get_token()
+        self.connection.timeout = self._request_timeout
+        self.keycloak_openid.connection.timeout = self._request_timeout
+
+        if self._limiter is not None:
+            self._connection = _RateLimitedConnection(
+                self._limiter,
+                base_url=self.server_url,
+                headers=self.connection.headers,
+                timeout=self._request_timeout,
+                verify=self.verify
+            )
+
+    def refresh_token(self):
+        requested_at = time.monotonic()
+
+        with self._refresh_lock:
+            if self._refreshed_at > requested_at:
+                return
+
+            super().refresh_token()
+            self._refreshed_at = time.monotonic()
+
+
+def _create_openid(timeout: float, **kwargs) -> KeycloakOpenID:
+    openid = KeycloakOpenID(**kwargs)
+    openid.connection.timeout = timeout
+    return openid
+
+
+def _create_executor(pool_size: int, limiter: RateLimiter = None):
+    executor = ThreadPoolExecutor(
+        max_workers=pool_size,
+        thread_name_prefix='keycloak'
+    )
+
+    if limiter is None:
+        return executor
+
+    return _RateLimitedExecutor(executor, limiter)
 
 
 class Keycloak:
@@ -9,19 +120,31 @@ class Keycloak:
         client_id: str,
         client_secret: str,
         username: str,
-        password: str
+        password: str,
+        pool_size: int = 8,
+        timeout: float = 10,
+        rate: float = None
     ):
-        self.cli_openid = KeycloakOpenID(
+        self.cli_openid = Proxy(Provider(lambda: _create_openid(
+            timeout,
             server_url=server,
             client_id=client_id,
             client_secret_key=client_secret,
             realm_name=realm
-        )
-        self.cli_admin = KeycloakAdmin(
+        )))
+        limiter = Provider(lambda: RateLimiter(rate) if rate else None)
+        self.cli_admin = Proxy(Provider(lambda: _KeycloakAdmin(
+            timeout,
+            limiter.get(),
             server_url=server,
             username=username,
             password=password,
             realm_name=realm,
             verify=True,
             auto_refresh_token=['get', 'post', 'put', 'delete']
-        )
+        )))
+        self.executor = Proxy(Provider(lambda: _create_executor(
+            pool_size,
+            limiter.get()
+        )))
+        self.timeout = timeout
@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import time
+import weakref
+from concurrent.futures import Future
+from functools import partial
+from threading import Lock, Thread
+from confluent_kafka import Producer
+
+from domain.exception import UnexpectedError
+from domain.util import metrics
+
+
+_log = logging.getLogger(__name__)
+
+
+class AsyncProducer:
+    _instances = weakref.WeakSet()
+
+    def __init__(
+        self,
+        name: str,
+        config: dict,
+        queue_size: int = 10000,
+        queue_policy: str = 'block',
+        block_timeout: float = 5.0,
+        drain_timeout: float = 10.0,
+        poll_interval: float = 0.1
+    ):
+        if queue_policy not in ('block', 'drop', 'error'):
+            raise ValueError(f'Invalid queue policy {queue_policy}')
+
+        self._name = name
+        self._config = {**config, 'queue.buffering.max.messages': queue_size}
+        self._queue_policy = queue_policy
+        self._block_timeout = block_timeout
+        self._drain_timeout = drain_timeout
+        self._poll_interval = poll_interval
+        self._producer = None
+        self._pid = None
+        self._lock = Lock()
+        self._latency = metrics.histogram(
+            'kafka_delivery_seconds',
+            producer=name
+        )
+        self._failures = metrics.counter(
+            'kafka_delivery_failures_total',
+            producer=name
+        )
+        self._dropped = metrics.counter(
+            'kafka_dropped_messages_total',
+            producer=name
+        )
+        atexit.register(self.close)
+        AsyncProducer._instances.add(self)
+
+    @classmethod
+    def close_all(cls, timeout: float = None):
+        for producer in list(cls._instances):
+            producer.close(timeout)
+
+    def _get_producer(self) -> Producer:
+        pid = os.getpid()
+
+        if self._producer is not None and self._pid == pid:
+            return self._producer
+
+        with self._lock:
+            if self._producer is None or self._pid != pid:
+                self._producer = Producer(self._config)
+                self._pid = pid
+                Thread(
+                    target=self._poll_loop,
+                    args=(self._producer,),
+                    daemon=True
+                ).start()
+                _log.info(f'Producer {self._name} started (pid={pid})')
+
+        return self._producer
+
+    def _poll_loop(self, producer: Producer):
+        while self._producer is producer:
+            producer.poll(self._poll_interval)
+
+    def _on_delivery(self, future: Future, started_at: float, err, msg):
+        self._latency.observe(time.perf_counter() - started_at)
+
+        if err is not None:
+            self._failures.inc()
+            _log.error(
+                f'Failed to deliver message to {msg.topic()} '
+                f'(key={msg.key()}): {err}'
+            )
+            future.set_exception(UnexpectedError(str(err)))
+        else:
+            future.set_result(msg)
+
+    def _wait_for_room(self, producer: Producer, produce):
+        deadline = time.monotonic() + self._block_timeout
+
+        while time.monotonic() < deadline:
+            producer.poll(self._poll_interval)
+
+            try:
+                return produce()
+            except BufferError:
+                continue
+
+        raise UnexpectedError(f'Producer {self._name} queue is full')
+
+    def produce(
+        self,
+        topic: str,
+        value: str,
+        key: str = None,
+        headers: dict = None
+    ) -> Future:
+        producer = self._get_producer()
+        future = Future()
+        callback = partial(self._on_delivery, future, time.perf_counter())
+        produce = partial(
+            producer.produce,
+            topic,
+            value=value,
+            key=key,
+            headers=headers,
+            on_delivery=callback
+        )
+
+        try:
+            produce()
+        except BufferError:
+            if self._queue_policy == 'drop':
+                self._dropped.inc()
+                _log.warning(f'Producer {self._name} dropped message {key}')
+                future.set_exception(
+                    UnexpectedError(f'Producer {self._name} queue is full')
+                )
+            elif self._queue_policy == 'error':
+                raise UnexpectedError(f'Producer {self._name} queue is full')
+            else:
+                self._wait_for_room(producer, produce)
+
+        return future
+
+    def flush(self, timeout: float = None) -> int:
+        if self._producer is None or self._pid != os.getpid():
+            return 0
+
+        timeout = self._drain_timeout if timeout is None else timeout
+        return self._producer.flush(timeout)
+
+    def close(self, timeout: float = None):
+        remaining = self.flush(timeout)
+
+        if remaining:
+            _log.warning(
+                f'Producer {self._name} closed with {remaining} '
+                'undelivered messages'
+            )
+
+        with self._lock:
+            self._producer = None
@@ -0,0 +1,61 @@
+import os
+import weakref
+from threading import Lock
+from typing import Any, Callable
+
+
+_providers = weakref.WeakSet()
+
+
+class Provider:
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._pid = None
+        self._lock = Lock()
+        _providers.add(self)
+
+    def get(self) -> Any:
+        pid = os.getpid()
+
+        if self._pid == pid:
+            return self._instance
+
+        with self._lock:
+            if self._pid != pid:
+                self._instance = self._factory()
+                self._pid = pid
+
+        return self._instance
+
+    def reset(self):
+        with self._lock:
+            self._instance = None
+            self._pid = None
+
+    def _after_fork(self):
+        self._lock = Lock()
+
+
+class Proxy:
+    def __init__(self, provider: Provider):
+        object.__setattr__(self, '_provider', provider)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._provider.get(), name)
+
+    def __getitem__(self, key) -> Any:
+        return self._provider.get()[key]
+
+
+class LazyDatabase(Proxy):
+    def __getitem__(self, name: str) -> Proxy:
+        return Proxy(Provider(lambda: self._provider.get()[name]))
+
+
+def _reset_locks():
+    for provider in list(_providers):
+        provider._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
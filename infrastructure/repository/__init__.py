@@ -1,7 +1,9 @@
 from .security import SecurityRepository
 from .token import TokenRepository
-from .notification import Notifier, HttpNotifier
-from .protocol import ProtocolPublisher
+from .notification import Notifier, HttpNotifier, OutboxNotifier
+from .outbox import OutboxRepository
+from .ledger import LedgerRepository
+from .protocol import ProtocolPublisher, OutboxProtocolPublisher
 
 
 __all__ = [
@@ -9,5 +11,9 @@ __all__ = [
     'TokenRepository',
     'Notifier',
     'ProtocolPublisher',
-    'HttpNotifier'
+    'HttpNotifier',
+    'OutboxNotifier',
+    'OutboxRepository',
+    'OutboxProtocolPublisher',
+    'LedgerRepository'
 ]
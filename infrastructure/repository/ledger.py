@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import List, Set
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+
+
+_DUPLICATE_KEY = 11000
+
+
+class LedgerRepository:
+    def __init__(self, db: Database):
+        self._collection = db['processed_messages']
+
+    def create_indexes(self, retention: int):
+        self._collection.create_index(
+            'processed_at',
+            name='processed_at_ttl',
+            expireAfterSeconds=retention
+        )
+
+    def find_processed(self, keys: List[str]) -> Set[str]:
+        if not keys:
+            return set()
+
+        cursor = self._collection.find(
+            {'_id': {'$in': keys}},
+            projection={'_id': True}
+        )
+
+        return {doc['_id'] for doc in cursor}
+
+    def mark_processed(self, keys: List[str]):
+        if not keys:
+            return
+
+        now = datetime.utcnow()
+
+        try:
+            self._collection.insert_many(
+                [{'_id': key, 'processed_at': now} for key in keys],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+
+            if any(error['code'] != _DUPLICATE_KEY for error in errors):
+                raise
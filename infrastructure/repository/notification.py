@@ -1,21 +1,34 @@
 import json
 import logging
+import os
+import random
 import requests
+import time
+from abc import abstractmethod
 from base64 import urlsafe_b64encode
 from datetime import datetime
-from confluent_kafka import Producer
+from queue import Full, Queue
+from threading import Lock, Thread
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
 from domain.exception import UnexpectedError
 from domain.model import User
 from domain.repository import INotifier
+from domain.util import metrics
+from ..producer import AsyncProducer
+from .outbox import OutboxRepository
 
 
-class Notifier(INotifier):
-    def __init__(self, config: dict, templates: dict, urls: dict):
-        self._config = config
+class BaseNotifier(INotifier):
+    def __init__(self, templates: dict, urls: dict):
         self._templates = templates
         self._urls = urls
 
+    @abstractmethod
+    def _publish(self, key: str, payload: str):
+        pass
+
     def _send(self, template_id, subject, user, link, code):
         code = str(urlsafe_b64encode(code.encode('ascii')), 'utf-8')
         payload = json.dumps({
@@ -31,9 +44,7 @@ class Notifier(INotifier):
         }, ensure_ascii=False)
 
         _id = f'{user.id}:{datetime.utcnow().isoformat()}'
-        producer = Producer(self._config)
-        producer.produce('NOTIFICATION', key=_id, value=payload)
-        producer.flush()
+        self._publish(_id, payload)
 
     def send_owner_email_verification(self, user: User, code: str):
         self._send(
@@ -63,55 +74,172 @@ class Notifier(INotifier):
         )
 
 
-class HttpNotifier:
-    def __init__(self, templates: dict, urls: str):
-        self._templates = templates
-        self._urls = urls
+class Notifier(BaseNotifier):
+    def __init__(
+        self,
+        config: dict,
+        templates: dict,
+        urls: dict,
+        producer_options: dict = None
+    ):
+        super().__init__(templates, urls)
+        self._producer = AsyncProducer(
+            'notification',
+            config,
+            **(producer_options or {})
+        )
+
+    def _publish(self, key: str, payload: str):
+        self._producer.produce('NOTIFICATION', payload, key=key)
+
+
+class OutboxNotifier(BaseNotifier):
+    def __init__(self, outbox: OutboxRepository, templates: dict, urls: dict):
+        super().__init__(templates, urls)
+        self._outbox = outbox
+
+    def _publish(self, key: str, payload: str):
+        self._outbox.add('NOTIFICATION', key, payload)
+
+
+def _is_connect_error(error: requests.ConnectionError) -> bool:
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpNotifier(BaseNotifier):
+    def __init__(
+        self,
+        templates: dict,
+        urls: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        fire_and_forget: bool = False,
+        queue_size: int = 1000,
+        workers: int = 2
+    ):
+        super().__init__(templates, urls)
+        self._pool_size = pool_size
+        self._timeout = (connect_timeout, read_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._fire_and_forget = fire_and_forget
+        self._queue_size = queue_size
+        self._workers = workers
+        self._session = None
+        self._queue = None
+        self._pid = None
+        self._lock = Lock()
+        self._latency = metrics.histogram('http_notification_seconds')
+        self._retried = metrics.counter('http_notification_retries_total')
+        self._failures = metrics.counter('http_notification_failures_total')
         self._log = logging.getLogger(self.__class__.__name__)
 
-    def _send(self, template_id, subject, user, link, code):
-        code = str(urlsafe_b64encode(code.encode('ascii')), 'utf-8')
-        payload = {
-            'email': {
-                'template_id': template_id,
-                'subject': subject,
-                'recipient': [user.email],
-                'content': {
-                    'first_name': user.firstName,
-                    'link': link + '/' + code
-                }
-            }
-        }
+    def _init_process(self):
+        pid = os.getpid()
+
+        if self._pid == pid:
+            return
+
+        with self._lock:
+            if self._pid == pid:
+                return
+
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=self._pool_size
+            )
+            self._session = requests.Session()
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
 
-        response = requests.post(self._urls['notification_uri'], json=payload)
+            if self._fire_and_forget:
+                self._queue = Queue(self._queue_size)
+
+                for _ in range(self._workers):
+                    Thread(target=self._work, daemon=True).start()
+
+            self._pid = pid
+
+    def _work(self):
+        queue = self._queue
+
+        while True:
+            key, payload = queue.get()
+
+            try:
+                self._post(key, payload)
+            except Exception as e:
+                self._log.error(f'Notification was not delivered: {e}')
+            finally:
+                queue.task_done()
+
+    def _post(self, key: str, payload: str):
+        uri = self._urls['notification_uri']
+        headers = {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': key
+        }
+        response = None
+        error = None
+
+        for attempt in range(self._retries + 1):
+            if attempt > 0:
+                self._retried.inc()
+                # Retry jitter is not security sensitive
+                limit = self._backoff * 2 ** attempt
+                time.sleep(random.uniform(0, limit))  # nosec
+
+            start = time.perf_counter()
+
+            try:
+                response = self._session.post(
+                    uri,
+                    data=payload.encode('utf-8'),
+                    headers=headers,
+                    timeout=self._timeout
+                )
+                error = None
+            except requests.ConnectionError as e:
+                response, error = None, e
+
+                if not _is_connect_error(e):
+                    break
+            except requests.Timeout as e:
+                self._failures.inc()
+                raise UnexpectedError(f'Notification service timed out: {e}')
+            finally:
+                self._latency.observe(time.perf_counter() - start)
+
+            if response is not None and response.status_code < 500:
+                break
+
+        if response is None:
+            self._failures.inc()
+            raise UnexpectedError(f'Notification service unavailable: {error}')
 
         if not response.ok:
+            self._failures.inc()
             self._log.error(response.text)
             raise UnexpectedError(response.text)
 
-    def send_owner_email_verification(self, user: User, code: str):
-        self._send(
-            self._templates['email_verification'],
-            '[SIMA] - Verificação de e-mail',
-            user,
-            self._urls['owner_email_verification'],
-            code
-        )
+    def _publish(self, key: str, payload: str):
+        self._init_process()
 
-    def send_email_verification(self, user: User, code: str):
-        self._send(
-            self._templates['email_verification'],
-            '[SIMA] - Verificação de e-mail',
-            user,
-            self._urls['email_verification'],
-            code
-        )
+        if not self._fire_and_forget:
+            self._post(key, payload)
+            return
 
-    def send_reset_password(self, user: User, code: str):
-        self._send(
-            self._templates['reset_password'],
-            '[SIMA] - Redefinição de senha',
-            user,
-            self._urls['reset_password'],
-            code
-        )
+        try:
+            self._queue.put_nowait((key, payload))
+        except Full:
+            self._failures.inc()
+            raise UnexpectedError('Notification queue is full')
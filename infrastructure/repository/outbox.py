@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+from pymongo import ASCENDING
+from pymongo.database import Database
+
+
+class OutboxRepository:
+    def __init__(self, db: Database):
+        self._collection = db['outbox']
+
+    def create_indexes(self, retention: int):
+        self._collection.create_index(
+            [('sent_at', ASCENDING), ('created_at', ASCENDING)]
+        )
+        self._collection.create_index(
+            'sent_at',
+            name='sent_at_ttl',
+            expireAfterSeconds=retention
+        )
+
+    def add(self, topic: str, key: str, payload: str) -> str:
+        event_id = str(uuid4())
+        self._collection.insert_one({
+            '_id': event_id,
+            'topic': topic,
+            'key': key,
+            'payload': payload,
+            'created_at': datetime.utcnow(),
+            'sent_at': None,
+            'attempts': 0,
+            'claimed_by': None,
+            'claimed_until': None
+        })
+
+        return event_id
+
+    def claim_pending(
+        self,
+        limit: int,
+        max_attempts: int,
+        lease: float
+    ) -> List[dict]:
+        now = datetime.utcnow()
+        claimable = {
+            'sent_at': None,
+            'attempts': {'$lt': max_attempts},
+            '$or': [
+                {'claimed_until': None},
+                {'claimed_until': {'$lt': now}}
+            ]
+        }
+        ids = [
+            doc['_id']
+            for doc in self._collection
+            .find(claimable, projection={'_id': True})
+            .sort('created_at', ASCENDING)
+            .limit(limit)
+        ]
+
+        if not ids:
+            return []
+
+        claim_id = str(uuid4())
+        self._collection.update_many(
+            {**claimable, '_id': {'$in': ids}},
+            {'$set': {
+                'claimed_by': claim_id,
+                'claimed_until': now + timedelta(seconds=lease)
+            }}
+        )
+        cursor = self._collection \
+            .find({'claimed_by': claim_id}) \
+            .sort('created_at', ASCENDING)
+
+        return list(cursor)
+
+    def count_exhausted(self, max_attempts: int) -> int:
+        return self._collection.count_documents(
+            {'sent_at': None, 'attempts': {'$gte': max_attempts}}
+        )
+
+    def mark_sent(self, ids: List[str]):
+        if ids:
+            self._collection.update_many(
+                {'_id': {'$in': ids}},
+                {'$set': {'sent_at': datetime.utcnow()}}
+            )
+
+    def mark_failed(self, ids: List[str], max_attempts: int) -> List[str]:
+        if not ids:
+            return []
+
+        self._collection.update_many(
+            {'_id': {'$in': ids}},
+            {
+                '$inc': {'attempts': 1},
+                '$set': {'claimed_by': None, 'claimed_until': None}
+            }
+        )
+        cursor = self._collection.find(
+            {'_id': {'$in': ids}, 'attempts': {'$gte': max_attempts}},
+            projection={'_id': True}
+        )
+
+        return [doc['_id'] for doc in cursor]
+
+    def watch_inserts(self, max_await_time_ms: int):
+        return self._collection.watch(
+            [{'$match': {'operationType': 'insert'}}],
+            max_await_time_ms=max_await_time_ms
+        )
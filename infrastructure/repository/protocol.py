@@ -1,15 +1,19 @@
 import json
-from confluent_kafka import Producer
+from abc import abstractmethod
+from concurrent.futures import Future
 
 from domain.model import Owner
 from domain.repository import IProtocolPublisher
+from ..producer import AsyncProducer
+from .outbox import OutboxRepository
 
 
-class ProtocolPublisher(IProtocolPublisher):
-    def __init__(self, config: dict):
-        self._producer = Producer(config)
+class BaseProtocolPublisher(IProtocolPublisher):
+    @abstractmethod
+    def _publish(self, key: str, payload: str) -> Future:
+        pass
 
-    def send_new_owner(self, owner: Owner):
+    def send_new_owner(self, owner: Owner) -> Future:
         payload = json.dumps({
             'requester': 'AUTH-SERVICE',
             'protocol_type': 'NEW_OWNER',
@@ -17,5 +21,41 @@ class ProtocolPublisher(IProtocolPublisher):
             'owner': owner.asdict()
         }, ensure_ascii=False)
 
-        self._producer.produce('PROTOCOL_NEW_OWNER', payload, owner._id)
-        self._producer.flush()
+        return self._publish(owner._id, payload)
+
+
+class ProtocolPublisher(BaseProtocolPublisher):
+    def __init__(
+        self,
+        config: dict,
+        producer_options: dict = None,
+        asynchronous: bool = True,
+        delivery_timeout: float = 10.0
+    ):
+        super().__init__()
+        self._producer = AsyncProducer(
+            'protocol',
+            config,
+            **(producer_options or {})
+        )
+        self._asynchronous = asynchronous
+        self._delivery_timeout = delivery_timeout
+
+    def _publish(self, key: str, payload: str) -> Future:
+        future = self._producer.produce('PROTOCOL_NEW_OWNER', payload, key=key)
+
+        if not self._asynchronous:
+            future.result(self._delivery_timeout)
+
+        return future
+
+
+class OutboxProtocolPublisher(BaseProtocolPublisher):
+    def __init__(self, outbox: OutboxRepository):
+        super().__init__()
+        self._outbox = outbox
+
+    def _publish(self, key: str, payload: str) -> Future:
+        future = Future()
+        future.set_result(self._outbox.add('PROTOCOL_NEW_OWNER', key, payload))
+        return future
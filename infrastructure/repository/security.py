@@ -1,4 +1,7 @@
 import json
+import logging
+import time
+from concurrent.futures import Future, TimeoutError
 from http import HTTPStatus
 from typing import List
 from keycloak.exceptions import KeycloakGetError, KeycloakAuthenticationError
@@ -20,13 +23,42 @@ from domain.exception import (
     GroupError
 )
 from domain.repository import ISecurityRepository
+from domain.util import metrics
+from domain.util.singleflight import SingleFlight
+from ..catalog import RealmCatalog
 from ..keycloak import Keycloak
 
 
+_log = logging.getLogger(__name__)
+
+
+def _normalize_attributes(attributes: dict) -> dict:
+    normalized = {}
+
+    for key, value in (attributes or {}).items():
+        values = value if isinstance(value, list) else [value]
+        values = [item for item in values if item is not None]
+
+        if values:
+            normalized[key] = values
+
+    return normalized
+
+
 class SecurityRepository(ISecurityRepository):
-    def __init__(self, keycloak: Keycloak):
+    def __init__(self, keycloak: Keycloak, catalog_refresh: float = 300):
         self._admin = keycloak.cli_admin
         self._openid = keycloak.cli_openid
+        self._executor = keycloak.executor
+        self._timeout = keycloak.timeout
+        self._flight = SingleFlight('keycloak')
+        self._catalog = RealmCatalog(self._admin, catalog_refresh)
+
+    def load_catalog(self):
+        try:
+            self._catalog.load()
+        except Exception as e:
+            _log.warning(f'Realm catalog will be loaded on first use: {e}')
 
     def _get_error_message(self, error: KeycloakGetError) -> str:
         return json.loads(error.response_body)['error_description']
@@ -54,24 +86,36 @@ class SecurityRepository(ISecurityRepository):
             raise AuthorizationError(self._get_error_message(error))
 
     def introspect_token(self, access_token: str) -> dict:
-        return self._openid.introspect(access_token)
+        return self._flight.do(
+            ('introspect_token', access_token),
+            self._openid.introspect,
+            access_token
+        )
 
     def _get_roles_by_name(self, role_names: List[str]) -> List[dict]:
+        if any(self._catalog.find_role(name) is None for name in role_names):
+            self._catalog.refresh()
+
         roles = []
 
         for name in role_names:
-            try:
-                roles.append(self._admin.get_realm_role(name))
-            except KeycloakGetError:
+            role = self._catalog.find_role(name)
+
+            if role is None:
                 raise RoleError(f'Role {name} does not exist')
 
+            roles.append(role)
+
         return roles
 
     def _get_groups_by_name(self, group_names: List[str]) -> List[dict]:
+        if any(self._catalog.find_group(name) is None for name in group_names):
+            self._catalog.refresh()
+
         groups = []
 
         for name in group_names:
-            group = self._admin.get_group_by_path('/' + name)
+            group = self._catalog.find_group(name)
 
             if group is None:
                 raise GroupError(f'Group {name} does not exist')
@@ -80,6 +124,20 @@ class SecurityRepository(ISecurityRepository):
 
         return groups
 
+    def _gather(self, futures: List[Future]) -> list:
+        deadline = time.monotonic() + self._timeout
+
+        try:
+            return [
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+                for future in futures
+            ]
+        except TimeoutError:
+            raise UnexpectedError('Keycloak request timed out')
+        finally:
+            for future in futures:
+                future.cancel()
+
     def _get_user_details(self, user_repr: dict) -> User:
         _id = user_repr['id']
 
@@ -88,23 +146,18 @@ class SecurityRepository(ISecurityRepository):
             for key, value in user_repr.pop('attributes', {}).items()
         }
 
-        groups = [
-            group['name']
-            for group in self._admin.get_user_groups(_id)
-        ]
-
-        roles = [
-            role['name']
-            for role in self._admin.get_realm_roles_of_user(_id)
-        ]
-
         roles_path = f'/admin/realms/{self._admin.realm_name}' \
                      f'/users/{_id}/role-mappings/realm/composite'
 
-        effective_roles = [
-            role['name']
-            for role in self._admin.raw_get(roles_path).json()
-        ]
+        user_groups, user_roles, composite_roles = self._gather([
+            self._executor.submit(self._admin.get_user_groups, _id),
+            self._executor.submit(self._admin.get_realm_roles_of_user, _id),
+            self._executor.submit(self._admin.raw_get, roles_path)
+        ])
+
+        groups = [group['name'] for group in user_groups]
+        roles = [role['name'] for role in user_roles]
+        effective_roles = [role['name'] for role in composite_roles.json()]
 
         return User.from_dict({
             **user_repr,
@@ -123,6 +176,13 @@ class SecurityRepository(ISecurityRepository):
         return len(results) > 0
 
     def find_user_by_id(self, _id: str) -> User:
+        return self._flight.do(
+            ('find_user_by_id', _id),
+            self._find_user_by_id,
+            _id
+        )
+
+    def _find_user_by_id(self, _id: str) -> User:
         try:
             result = self._admin.get_user(_id)
             return self._get_user_details(result)
@@ -132,6 +192,13 @@ class SecurityRepository(ISecurityRepository):
             raise UnexpectedError(err)
 
     def find_user_by_username(self, username: str) -> User:
+        return self._flight.do(
+            ('find_user_by_username', username),
+            self._find_user_by_username,
+            username
+        )
+
+    def _find_user_by_username(self, username: str) -> User:
         results = self._admin.get_users({'username': username})
 
         if len(results) == 0:
@@ -175,16 +242,40 @@ class SecurityRepository(ISecurityRepository):
 
         return user_id
 
+    def _is_user_changed(self, current: dict, user_repr: dict) -> bool:
+        for key in ('emailVerified', 'enabled', 'firstName', 'lastName'):
+            if current.get(key) != user_repr[key]:
+                return True
+
+        for key in ('username', 'email'):
+            current_value = (current.get(key) or '').lower()
+
+            if current_value != (user_repr[key] or '').lower():
+                return True
+
+        current_attribs = _normalize_attributes(current.get('attributes'))
+        new_attribs = _normalize_attributes(user_repr.get('attributes'))
+
+        if current_attribs != new_attribs:
+            return True
+
+        current_actions = set(current.get('requiredActions') or [])
+        return current_actions != set(user_repr['requiredActions'] or [])
+
     def update_user(self, user: User):
         try:
-            self._admin.get_user(user.id)
+            current, current_groups, current_roles = self._gather([
+                self._executor.submit(self._admin.get_user, user.id),
+                self._executor.submit(self._admin.get_user_groups, user.id),
+                self._executor.submit(
+                    self._admin.get_realm_roles_of_user,
+                    user.id
+                )
+            ])
         except KeycloakGetError:
             raise UserError(f'User with id {user.id} not found')
 
-        current_groups = self._admin.get_user_groups(user.id)
         new_groups = self._get_groups_by_name(user.groups)
-
-        current_roles = self._admin.get_realm_roles_of_user(user.id)
         new_roles = self._get_roles_by_name(user.roles)
 
         user_repr = {
@@ -201,19 +292,54 @@ class SecurityRepository(ISecurityRepository):
             'requiredActions': user.requiredActions
         }
 
-        self._admin.update_user(user.id, user_repr)
+        current_group_ids = {group['id'] for group in current_groups}
+        new_group_ids = {group['id'] for group in new_groups}
+        added_groups = [
+            group for group in new_groups
+            if group['id'] not in current_group_ids
+        ]
+        removed_groups = [
+            group for group in current_groups
+            if group['id'] not in new_group_ids
+        ]
 
-        for group in current_groups:
-            self._admin.group_user_remove(user.id, group['id'])
+        current_role_names = {role['name'] for role in current_roles}
+        new_role_names = {role['name'] for role in new_roles}
+        added_roles = [
+            role for role in new_roles
+            if role['name'] not in current_role_names
+        ]
+        removed_roles = [
+            role for role in current_roles
+            if role['name'] not in new_role_names
+        ]
+
+        is_user_changed = self._is_user_changed(current, user_repr)
+
+        if is_user_changed:
+            self._admin.update_user(user.id, user_repr)
 
-        for group in new_groups:
+        for group in added_groups:
             self._admin.group_user_add(user.id, group['id'])
 
-        if current_roles:
-            self._admin.delete_user_realm_role(user.id, current_roles)
+        for group in removed_groups:
+            self._admin.group_user_remove(user.id, group['id'])
+
+        if added_roles:
+            self._admin.assign_realm_roles(user.id, added_roles)
+
+        if removed_roles:
+            self._admin.delete_user_realm_role(user.id, removed_roles)
+
+        rewrite_calls = 1 + len(current_groups) + len(new_groups) + \
+            bool(current_roles) + bool(new_roles)
+        diff_calls = is_user_changed + len(added_groups) + \
+            len(removed_groups) + bool(added_roles) + bool(removed_roles)
 
-        if new_roles:
-            self._admin.assign_realm_roles(user.id, new_roles)
+        metrics.counter(
+            'keycloak_skipped_writes_total',
+            operation='update_user'
+        ).inc(rewrite_calls - diff_calls)
 
     def remove_user(self, _id: str):
         try:
@@ -228,12 +354,22 @@ class SecurityRepository(ISecurityRepository):
             raise UserError(f'User with id {user_id} not found')
 
     def find_all_groups(self) -> List[GroupSummary]:
+        return self._flight.do(('find_all_groups',), self._find_all_groups)
+
+    def _find_all_groups(self) -> List[GroupSummary]:
         return [
             GroupSummary.from_dict(group)
             for group in self._admin.get_groups()
         ]
 
     def find_group_by_id(self, _id: str) -> Group:
+        return self._flight.do(
+            ('find_group_by_id', _id),
+            self._find_group_by_id,
+            _id
+        )
+
+    def _find_group_by_id(self, _id: str) -> Group:
         try:
             group = self._admin.get_group(_id)
             roles = [
@@ -255,6 +391,7 @@ class SecurityRepository(ISecurityRepository):
                 raise GroupError(f'Group {group.name} already exists')
             raise UnexpectedError(err)
 
+        self._catalog.invalidate()
         group_id = self._admin.get_group_by_path(f'/{group.name}')['id']
 
         if roles:
@@ -264,25 +401,53 @@ class SecurityRepository(ISecurityRepository):
 
     def update_group(self, group: Group):
         try:
-            self._admin.get_group(group.id)
+            current = self._admin.get_group(group.id)
         except KeycloakGetError:
             raise GroupError(f'Group with id {group.id} not found')
 
-        current_roles = self._admin.get_group_realm_roles(group.id)
+        if 'realmRoles' in current:
+            current_role_names = set(current['realmRoles'])
+        else:
+            current_role_names = {
+                role['name']
+                for role in self._admin.get_group_realm_roles(group.id)
+            }
+
         new_roles = self._get_roles_by_name(group.roles)
+        new_role_names = {role['name'] for role in new_roles}
+        added_roles = [
+            role for role in new_roles
+            if role['name'] not in current_role_names
+        ]
+        removed_roles = self._get_roles_by_name(
+            sorted(current_role_names - new_role_names)
+        )
 
-        try:
-            self._admin.update_group(group.id, {'name': group.name})
-        except KeycloakGetError as err:
-            if err.response_code == HTTPStatus.CONFLICT:
-                raise GroupError(f'Group {group.name} already exists')
-            raise UnexpectedError(err)
+        is_renamed = current.get('name') != group.name
+
+        if is_renamed:
+            try:
+                self._admin.update_group(group.id, {'name': group.name})
+            except KeycloakGetError as err:
+                if err.response_code == HTTPStatus.CONFLICT:
+                    raise GroupError(f'Group {group.name} already exists')
+                raise UnexpectedError(err)
+
+            self._catalog.invalidate()
+
+        if added_roles:
+            self._admin.assign_group_realm_roles(group.id, added_roles)
+
+        if removed_roles:
+            self._admin.delete_group_realm_roles(group.id, removed_roles)
 
-        if current_roles:
-            self._admin.delete_group_realm_roles(group.id, current_roles)
+        rewrite_calls = 1 + bool(current_role_names) + bool(new_roles)
+        diff_calls = is_renamed + bool(added_roles) + bool(removed_roles)
 
-        if new_roles:
-            self._admin.assign_group_realm_roles(group.id, new_roles)
+        metrics.counter(
+            'keycloak_skipped_writes_total',
+            operation='update_group'
+        ).inc(rewrite_calls - diff_calls)
 
     def remove_group(self, _id) -> dict:
         try:
@@ -290,6 +455,8 @@ class SecurityRepository(ISecurityRepository):
         except KeycloakGetError:
             raise GroupError(f'Group with id {_id} not found')
 
+        self._catalog.invalidate()
+
     def find_available_user_groups(self, user_id: str) -> List[str]:
         try:
             user_groups = {
@@ -297,16 +464,16 @@ class SecurityRepository(ISecurityRepository):
                 for group in self._admin.get_user_groups(user_id)
             }
 
-            all_groups = {
-                group['name']
-                for group in self._admin.get_groups()
-            }
+            all_groups = set(self._catalog.group_names())
 
             return list(all_groups - user_groups)
         except KeycloakGetError:
             raise UserError(f'User with id {user_id} not found')
 
     def find_all_roles(self) -> List[Role]:
+        return self._flight.do(('find_all_roles',), self._find_all_roles)
+
+    def _find_all_roles(self) -> List[Role]:
         return [
             Role.from_dict(role)
             for role in self._admin.get_realm_roles()
@@ -336,3 +503,4 @@ class SecurityRepository(ISecurityRepository):
 
     def create_role(self, role_name: str):
         self._admin.create_realm_role({'name': role_name}, skip_exists=True)
+        self._catalog.invalidate()
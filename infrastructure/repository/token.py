@@ -1,23 +1,246 @@
+import time
+from bson.binary import Binary
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DeleteMany, ReturnDocument
 from pymongo.database import Database
-from typing import Optional
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from typing import Optional, Tuple, Union
 
-from domain.model import Token
+from domain.model import Token, TokenStatus
 from domain.repository import ITokenRepository
 
 
+_INDEX_OPTIONS_CONFLICT = 85
+_MIGRATION_RETRIES = 5
+_KEY_SIZE = 32
+_LEGACY_KEY_LENGTH = 128
+
+
+def _key(code: str) -> Binary:
+    return Binary(bytes.fromhex(code)[:_KEY_SIZE])
+
+
+def _key_filter(code: str) -> Union[Binary, dict]:
+    if len(code) == _LEGACY_KEY_LENGTH:
+        return {'$in': [_key(code), code]}
+
+    return _key(code)
+
+
+def _to_token(doc: dict) -> Token:
+    if isinstance(doc['_id'], bytes):
+        doc = {**doc, '_id': doc['_id'].hex()}
+
+    return Token.from_dict(doc)
+
+
+def _truncate(value: datetime) -> datetime:
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+
+    return value.astimezone(timezone.utc)
+
+
 class TokenRepository(ITokenRepository):
     def __init__(self, db: Database):
         self._collection = db['tokens']
+        self._used = db['used_tokens']
+
+    def _create_ttl_index(self, collection, grace: int):
+        try:
+            collection.create_index(
+                'expire_at',
+                name='expire_at_ttl',
+                expireAfterSeconds=grace
+            )
+        except OperationFailure as e:
+            if e.code != _INDEX_OPTIONS_CONFLICT:
+                raise
+
+            collection.database.command(
+                'collMod',
+                collection.name,
+                index={'name': 'expire_at_ttl', 'expireAfterSeconds': grace}
+            )
+
+    def create_indexes(self, grace: int):
+        self._collection.create_index(
+            [('user_id', ASCENDING), ('action', ASCENDING)]
+        )
+        self._create_ttl_index(self._collection, grace)
+        self._create_ttl_index(self._used, grace)
+
+    def stats(self) -> dict:
+        stats = self._collection.database.command(
+            'collStats',
+            self._collection.name
+        )
+
+        return {
+            'count': stats.get('count', 0),
+            'size': stats.get('size', 0),
+            'storage_size': stats.get('storageSize', 0),
+            'total_index_size': stats.get('totalIndexSize', 0),
+            'index_sizes': stats.get('indexSizes', {})
+        }
+
+    def purge_used(
+        self,
+        used_before: datetime,
+        batch_size: int = 1000,
+        batches_per_round: int = 10
+    ) -> int:
+        query = {'access_at': {'$ne': None, '$lt': used_before}}
+        deleted = 0
+
+        while True:
+            ids = [
+                doc['_id']
+                for doc in self._collection
+                .find(query, projection={'_id': True})
+                .limit(batch_size * batches_per_round)
+            ]
+
+            if not ids:
+                return deleted
+
+            result = self._collection.bulk_write([
+                DeleteMany({'_id': {'$in': ids[i:i + batch_size]}})
+                for i in range(0, len(ids), batch_size)
+            ], ordered=False)
+            deleted += result.deleted_count
+
+    def _migrate(self, doc: dict):
+        key = _key(doc['_id'])
+
+        while doc is not None:
+            self._collection.replace_one(
+                {'_id': key},
+                {**doc, '_id': key, 'migrating': True},
+                upsert=True
+            )
+            result = self._collection.delete_one(
+                {'_id': doc['_id'], 'access_at': doc['access_at']}
+            )
+
+            if result.deleted_count:
+                self._collection.update_one(
+                    {'_id': key},
+                    {'$unset': {'migrating': ''}}
+                )
+                return
+
+            doc = self._collection.find_one({'_id': doc['_id']})
+
+        self._collection.delete_one({'_id': key})
+
+    def migrate_keys(self, batch_size: int = 1000) -> int:
+        migrated = 0
+
+        while True:
+            docs = list(
+                self._collection
+                .find({'_id': {'$type': 'string'}})
+                .limit(batch_size)
+            )
+
+            if not docs:
+                return migrated
+
+            for doc in docs:
+                self._migrate(doc)
+
+            migrated += len(docs)
 
     def find_by_code(self, code: str) -> Optional[Token]:
-        doc = self._collection.find_one({'_id': code})
-        return Token.from_dict(doc) if doc else None
+        doc = self._collection.find_one({'_id': _key_filter(code)})
+        return _to_token(doc) if doc else None
 
     def add(self, token: Token) -> Token:
-        result = self._collection.insert_one(token.asdict())
-        token._id = result.inserted_id
+        key = _key(token._id)
+        self._collection.insert_one({**token.asdict(), '_id': key})
+        token._id = key.hex()
         return token
 
     def update(self, token: Token) -> Token:
-        self._collection.replace_one({'_id': token._id}, token.asdict())
+        fields = token.asdict()
+        fields.pop('_id')
+        self._collection.update_one(
+            {'_id': _key_filter(token._id)},
+            {'$set': fields}
+        )
         return token
+
+    def consume(
+        self,
+        code: str,
+        action: str,
+        now: datetime
+    ) -> Tuple[TokenStatus, Optional[Token]]:
+        now = _truncate(now)
+
+        for attempt in range(_MIGRATION_RETRIES):
+            doc = self._collection.find_one_and_update(
+                {
+                    '_id': _key_filter(code),
+                    'migrating': {'$exists': False},
+                    'access_at': None,
+                    'expire_at': {'$gt': now},
+                    'action': action
+                },
+                {'$set': {'access_at': now}},
+                return_document=ReturnDocument.BEFORE
+            )
+
+            if doc is not None:
+                return TokenStatus.VALID, _to_token(doc)
+
+            docs = list(self._collection.find({'_id': _key_filter(code)}))
+            doc = next((d for d in docs if 'migrating' not in d), None)
+
+            if doc is not None or not docs:
+                break
+
+            time.sleep(0.01 * (attempt + 1))
+        else:
+            doc = docs[0]
+
+        if doc is None:
+            return TokenStatus.INVALID, None
+
+        token = _to_token(doc)
+
+        if token.access_at is not None:
+            return TokenStatus.USED, token
+
+        if _as_utc(token.expire_at) <= _as_utc(now):
+            return TokenStatus.EXPIRED, token
+
+        return TokenStatus.WRONG_ACTION, token
+
+    def mark_used(self, token: Token, now: datetime) -> bool:
+        try:
+            self._used.insert_one({
+                '_id': token._id,
+                'user_id': token.user_id,
+                'action': token.action,
+                'access_at': now,
+                'expire_at': token.expire_at
+            })
+        except DuplicateKeyError:
+            return False
+
+        return True
+
+    def unmark_used(self, token_id: str):
+        self._used.delete_one({'_id': token_id})
+
+    def release(self, code: str, access_at: datetime):
+        self._collection.update_one(
+            {'_id': _key_filter(code), 'access_at': _truncate(access_at)},
+            {'$set': {'access_at': None}}
+        )
@@ -1,7 +1,7 @@
 import click
 
 from config import Config
-from application import rest, kafka
+from application import rest, kafka, outbox, maintenance
 
 
 @click.group(invoke_without_command=True)
@@ -22,8 +22,9 @@ def start_flask_server(host: str, port: int):
 @click.option('--host', default='0.0.0.0', type=click.STRING)  # nosec
 @click.option('--port', default=5000, type=click.INT)
 @click.option('--workers', default=4, type=click.INT)
-def start_gunicorn_server(host: str, port: int, workers: int):
-    rest.start_gunicorn_server(Config, host, port, workers)
+@click.option('--preload/--no-preload', default=True)
+def start_gunicorn_server(host: str, port: int, workers: int, preload: bool):
+    rest.start_gunicorn_server(Config, host, port, workers, preload)
 
 
 @click.command()
@@ -31,9 +32,75 @@ def start_kafka_consumer():
     kafka.start_consumer(Config)
 
 
+@click.command()
+@click.option('--limit', default=None, type=click.INT)
+def replay_dlq(limit: int):
+    replayed = kafka.replay_dead_owners(Config, limit)
+    click.echo(f'Replayed {replayed} messages')
+
+
+@click.command()
+@click.option('--file', 'path', default=None, type=click.Path(exists=True))
+@click.option('--topic', default='NEW_OWNER', type=click.STRING)
+@click.option('--start-offset', default=None, type=click.INT)
+@click.option('--end-offset', default=None, type=click.INT)
+@click.option(
+    '--start-time',
+    default=None,
+    type=click.DateTime(),
+    help='Interpreted as UTC'
+)
+@click.option(
+    '--end-time',
+    default=None,
+    type=click.DateTime(),
+    help='Interpreted as UTC'
+)
+@click.option('--concurrency', default=8, type=click.INT)
+@click.option('--rate', default=None, type=click.FLOAT)
+@click.option('--checkpoint', default='backfill-owners.json')
+@click.option('--failures', default=None, type=click.Path())
+def backfill_owners(**options):
+    counts = kafka.backfill_owners(Config, echo=click.echo, **options)
+    click.echo(
+        f'Imported {counts["imported"]}, invalid {counts["invalid"]}, '
+        f'failed {counts["failed"]}'
+    )
+
+
+@click.command()
+@click.option('--used-for', default=3600, type=click.INT)
+@click.option('--batch-size', default=1000, type=click.INT)
+@click.option('--dry-run', is_flag=True)
+def maintain_tokens(used_for: int, batch_size: int, dry_run: bool):
+    maintenance.maintain_tokens(
+        Config,
+        used_for,
+        batch_size,
+        dry_run,
+        echo=click.echo
+    )
+
+
+@click.command()
+@click.option('--batch-size', default=1000, type=click.INT)
+def migrate_token_keys(batch_size: int):
+    maintenance.migrate_token_keys(Config, batch_size, echo=click.echo)
+
+
+@click.command()
+def start_outbox_relay():
+    outbox.start_relay(Config)
+
+
 entrypoint.add_command(start_flask_server)
 entrypoint.add_command(start_gunicorn_server)
 entrypoint.add_command(start_kafka_consumer)
+entrypoint.add_command(replay_dlq)
+entrypoint.add_command(backfill_owners)
+entrypoint.add_command(maintain_tokens)
+entrypoint.add_command(migrate_token_keys)
+entrypoint.add_command(start_outbox_relay)
 
 
 if __name__ == '__main__':